@@ -0,0 +1,142 @@
+import os
+import sys
+import argparse
+import threading
+import importlib.util
+
+# DuckDB is optional; without it every query runs against SQLite. It is only
+# imported when the first dashboard query runs.
+DUCKDB_AVAILABLE = importlib.util.find_spec('duckdb') is not None
+
+class AnalyticsEngine:
+    """Answer dashboard queries with embedded DuckDB when it is available
+
+    DuckDB attaches the SQLite file read-only, so aggregations run on its
+    vectorised engine instead of row by row in SQLite or in pandas. If DuckDB
+    or its sqlite extension cannot be loaded, the same results are computed
+    with SQLite. Price trends come from the rollup tables, which already hold
+    archived history.
+
+    The sqlite extension is never downloaded while serving requests; install
+    it once with `python analytics.py --install-extension`.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self._available = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        """Whether queries run on DuckDB; connects on first use"""
+        with self._lock:
+            if self._available is None:
+                self._available = DUCKDB_AVAILABLE and self._connect()
+            return self._available
+
+    def _connect(self):
+        import duckdb
+
+        try:
+            # Only load an extension that is already installed; autoinstalling
+            # would fetch it over the network in the middle of a request
+            self._conn = duckdb.connect(config={'autoinstall_known_extensions': False})
+            self._conn.execute('LOAD sqlite')
+            db_path = os.path.abspath(self.database.db_path).replace("'", "''")
+            self._conn.execute(f"ATTACH '{db_path}' AS scrape (TYPE sqlite, READ_ONLY)")
+            return True
+        except Exception as e:
+            print(f"⚠️  DuckDB analytics disabled, falling back to SQLite: {e}")
+            print("   Install the extension with: python analytics.py --install-extension")
+            self._conn = None
+            return False
+
+    @staticmethod
+    def _category_filter(category, keyword='WHERE'):
+        """SQL fragment and parameters restricting a query to one category"""
+        if category:
+            return f' {keyword} category = ?', [category]
+        return '', []
+
+    def _duckdb_query(self, query, params):
+        # DuckDB cursors are independent connections sharing one database,
+        # which makes them safe to use from concurrent request threads
+        with self._lock:
+            cursor = self._conn.cursor()
+        try:
+            return cursor.execute(query, params).df()
+        finally:
+            cursor.close()
+
+    def price_stats(self, category=None):
+        """Per-site product count and average/min/max price"""
+        if not self.available:
+            return self.database.get_price_stats(category=category)
+
+        where, params = self._category_filter(category)
+        query = f'''
+        SELECT
+            source_site,
+            CAST(SUM(product_count) AS BIGINT) AS count,
+            SUM(price_sum) / NULLIF(SUM(price_count), 0) AS avg_price,
+            MIN(min_price) AS min_price,
+            MAX(max_price) AS max_price
+        FROM scrape.daily_site_stats{where}
+        GROUP BY source_site
+        ORDER BY source_site
+        '''
+        return self._duckdb_query(query, params)
+
+    def rating_stats(self, category=None):
+        """Per-site count of rated products and average rating"""
+        if not self.available:
+            return self.database.get_rating_stats(category=category)
+
+        where, params = self._category_filter(category, 'AND')
+        query = f'''
+        SELECT
+            source_site,
+            CAST(SUM(rating_count) AS BIGINT) AS count,
+            SUM(rating_sum) / SUM(rating_count) AS avg_rating
+        FROM scrape.daily_site_stats
+        WHERE rating_count > 0{where}
+        GROUP BY source_site
+        ORDER BY source_site
+        '''
+        return self._duckdb_query(query, params)
+
+    def price_trend(self, category=None, start=None, end=None, max_points=500):
+        """Average price over time from the hourly/daily rollups
+
+        The rollups keep observations that were archived or pruned, so no
+        raw rows are scanned. The resolution is picked so that at most
+        max_points buckets come back. Returns a DataFrame with 'date' and
+        'price' columns, ready for Visualizer.price_trends.
+        """
+        series = self.database.price_series(start=start, end=end, category=category,
+                                             max_points=max_points)
+        return series.rename(columns={'time': 'date'})[['date', 'price']]
+
+
+def main():
+    """Install DuckDB's sqlite extension ahead of serving"""
+    parser = argparse.ArgumentParser(description='Set up the optional DuckDB analytics engine')
+    parser.add_argument('--install-extension', action='store_true',
+                        help="Download DuckDB's sqlite extension into the local extension directory")
+    args = parser.parse_args()
+
+    if not DUCKDB_AVAILABLE:
+        print("❌ DuckDB is not installed")
+        return 1
+    if args.install_extension:
+        import duckdb
+        duckdb.connect().execute('INSTALL sqlite')
+        print("✅ DuckDB sqlite extension installed")
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
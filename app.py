@@ -1,16 +1,85 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import gzip
+import json
+import sqlite3
+import base64
+import hashlib
+import threading
+import importlib.util
+from datetime import datetime, timezone
+from flask import (Flask, Response, abort, render_template, request, redirect, url_for,
+                   flash, jsonify, session)
 from scraper import EcommerceScraper
-from database import Database
-from visualizer import Visualizer
-import pandas as pd
+from database import Database, DEFAULT_COLUMNS, PRODUCT_COLUMNS, SERIES_RESOLUTIONS
+from visualizer import Visualizer, RenderPool, CHART_TYPES, CHART_FORMATS
+from writer import DatabaseWriter
+from analytics import AnalyticsEngine
+from matching import MatchingWorker
+from jobs import JobManager
+from response_cache import ResponseCache
 
 app = Flask(__name__)
 app.secret_key = 'ecommerce_scraper_secret_key'
 
-# Initialize components
-scraper = EcommerceScraper()
-database = Database()
-visualizer = Visualizer()
+# Components are created by init_components() in the process that serves
+# requests. Threads, process pools and connections do not survive fork(), so
+# the pre-fork server (serve.py) imports this module in each worker and
+# initializes them there.
+database = None
+visualizer = None
+writer = None
+analytics = None
+matching = None
+jobs = None
+response_cache = None
+_components_lock = threading.Lock()
+
+def init_components(render_workers=None):
+    """Create the database, writer, job and cache singletons of this process (once)
+
+    render_workers sizes the chart render pool; the pre-fork server passes its
+    share of the CPU cores.
+    """
+    global database, visualizer, writer, analytics, matching, jobs, response_cache
+    with _components_lock:
+        if database is not None:
+            return
+        database = Database()
+        # Charts render in worker processes, so concurrent /charts requests run in parallel
+        visualizer = Visualizer(cache_dir='cache/charts', render_pool=RenderPool(render_workers))
+        writer = DatabaseWriter(database)
+        analytics = AnalyticsEngine(database)
+        # Saved rows are matched across sites in the background, off the write path
+        matching = MatchingWorker(database)
+        matching.start()
+        # Crawls run in the background; /scrape only queues them
+        jobs = JobManager(EcommerceScraper, writer, state_dir='cache/jobs')
+        # Rendered /results and /search pages, keyed on the tables' write counters,
+        # so a save by any process (or any other program) invalidates them
+        response_cache = ResponseCache(lambda: tuple(sorted(database.table_versions().items())),
+                                       ttl=60, cache_dir='cache/pages')
+
+def shutdown_components():
+    """Let running scrapes finish, flush queued writes and stop the render pool"""
+    if jobs is not None:
+        jobs.shutdown(wait=True)
+        writer.close()
+        matching.close()
+        visualizer.render_pool.shutdown()
+
+@app.before_request
+def _ensure_components():
+    init_components()
+
+# results.html shows the start of each description
+RESULT_COLUMNS = DEFAULT_COLUMNS + ['description']
+
+# JSON responses at least this large are gzip (or brotli, when installed) encoded
+COMPRESS_MIN_SIZE = 500
+BROTLI_AVAILABLE = importlib.util.find_spec('brotli') is not None
+
+# Page size limits of the JSON API
+API_DEFAULT_LIMIT = 100
+API_MAX_LIMIT = 1000
 
 @app.route('/')
 def index():
@@ -21,39 +90,106 @@ def scrape():
     url = request.form.get('url')
     category = request.form.get('category', '')
     max_pages = int(request.form.get('max_pages', 1))
+    wants_json = request.accept_mimetypes.best == 'application/json'
     
     if not url:
+        if wants_json:
+            return jsonify({'success': False, 'error': 'Please enter a URL to scrape'}), 400
         flash('Please enter a URL to scrape', 'error')
         return redirect(url_for('index'))
     
     try:
-        # Extract domain for source_site
-        from urllib.parse import urlparse
-        parsed_url = urlparse(url)
-        source_site = parsed_url.netloc
-        
-        # Scrape products
-        products = scraper.scrape_product_listings(url, max_pages)
-        
-        if not products:
-            flash('No products found. Try adjusting the scraper settings.', 'warning')
-            return redirect(url_for('index'))
-        
-        # Save to database
-        database.save_products(products, source_site, category)
-        
-        flash(f'Successfully scraped {len(products)} products', 'success')
-        return redirect(url_for('results'))
-        
-    except Exception as e:
-        flash(f'Error during scraping: {str(e)}', 'error')
+        job = jobs.submit(url, category, max_pages)
+    except RuntimeError as e:
+        if wants_json:
+            return jsonify({'success': False, 'error': str(e)}), 503
+        flash(str(e), 'error')
         return redirect(url_for('index'))
+    
+    # The crawl runs in the background; progress is polled from /jobs/<id>
+    if wants_json:
+        return jsonify({'success': True, 'job': job.to_dict(),
+                        'status_url': url_for('job_status', job_id=job.id)}), 202
+    flash(f'Scraping {job.source_site} in the background', 'info')
+    return redirect(url_for('index', job=job.id))
+
+@app.route('/jobs')
+def job_list():
+    return jsonify(jobs.statuses())
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    # Under serve.py the job may run in another worker; its snapshot is in cache/jobs
+    status = jobs.status(job_id)
+    if status is None:
+        abort(404)
+    return jsonify(status)
+
+@app.route('/scrape/stream/<job_id>')
+def scrape_stream(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        # Only the worker running a job can stream it; main.js then polls /jobs/<id>
+        abort(404)
+    # Browsers resend the last id they saw when the connection drops
+    after = request.headers.get('Last-Event-ID', 0, type=int)
+    
+    def generate():
+        last = after
+        while True:
+            events = job.wait_events(last, timeout=15)
+            if not events:
+                # Comment line, keeps proxies from closing an idle stream
+                yield ': keep-alive\n\n'
+                continue
+            for event in events:
+                yield (f"id: {event['id']}\nevent: {event['event']}\n"
+                       f"data: {json.dumps(event['data'])}\n\n")
+                last = event['id']
+                if event['event'] == 'done':
+                    return
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _cached_page(route, render):
+    """Serve the page for this URL from response_cache, calling render() on a miss"""
+    # Rendering flashed messages consumes them, so such pages are never shared
+    if session.get('_flashes'):
+        return render()
+    
+    args = tuple(sorted(request.args.items(multi=True)))
+    generation = response_cache.generation()
+    body = response_cache.get(route, args, generation)
+    state = 'HIT'
+    if body is None:
+        body = render().encode('utf-8')
+        response_cache.put(route, args, body, generation)
+        state = 'MISS'
+    
+    response = Response(body, mimetype='text/html')
+    response.headers['X-Cache'] = state
+    return response
 
 @app.route('/results')
 def results():
-    category = request.args.get('category')
-    products = database.get_products(category=category)
-    return render_template('results.html', products=products, category=category)
+    def render():
+        category = request.args.get('category')
+        # e.g. /results?brand=Apple filters on the indexed additional_data attributes
+        attributes = {name: request.args[name]
+                      for name in database.indexed_attributes if name in request.args}
+        products = database.get_products(category=category, attributes=attributes,
+                                         columns=RESULT_COLUMNS)
+        return render_template('results.html', products=products, category=category)
+    
+    return _cached_page('results', render)
+
+def _search(query, **kwargs):
+    """database.search_products, with FTS5 query syntax errors as a 400"""
+    try:
+        return database.search_products(query, **kwargs)
+    except sqlite3.OperationalError as error:
+        abort(400, f"Invalid search query: {error}")
 
 @app.route('/search')
 def search():
@@ -61,42 +197,287 @@ def search():
     if not query:
         return redirect(url_for('results'))
     
-    products = database.search_products(query)
-    return render_template('results.html', products=products, search_query=query)
+    def render():
+        products = _search(query, columns=RESULT_COLUMNS)
+        return render_template('results.html', products=products, search_query=query)
+    
+    return _cached_page('search', render)
 
-@app.route('/visualizations')
-def visualizations():
+@app.route('/search/suggest')
+def search_suggest():
+    query = request.args.get('query', '')
+    products = database.search_products(query, limit=10, prefix=True)
+    return jsonify([{'id': p['id'], 'title': p['title']} for p in products])
+
+@app.route('/changes')
+def changes():
+    # Consumers poll with the last seq they saw: /changes?since=1234
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', 1000, type=int), 10000)
+    feed = database.changes_since(since, limit)
+    next_since = feed[-1]['seq'] if feed else since
+    return jsonify({'changes': feed, 'next_since': next_since})
+
+def _timestamp_arg(name):
+    """Query argument as a unix timestamp; accepts seconds or an ISO date (UTC)"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, f"Invalid {name}: {value}")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+@app.route('/api/price-series')
+def price_series():
+    # e.g. /api/price-series?start=2024-01-01&end=2025-01-01&resolution=auto&by_site=1
+    start, end = _timestamp_arg('start'), _timestamp_arg('end')
     category = request.args.get('category')
+    resolution = request.args.get('resolution', 'auto')
+    max_points = min(request.args.get('max_points', 500, type=int), 5000)
+    if resolution == 'auto':
+        resolution = database.series_resolution(start, end, max_points, category)
+    if resolution not in SERIES_RESOLUTIONS:
+        abort(400, f"Unknown resolution: {resolution}")
     
-    # Get data for visualizations
-    products = database.get_products(category=category)
-    price_stats = database.get_price_stats(category=category)
-    rating_stats = database.get_rating_stats(category=category)
+    by_site = request.args.get('by_site') in ('1', 'true')
+    df = database.price_series(start, end, resolution, category,
+                               source_site=request.args.get('site'), by_site=by_site)
+    points = [
+        {
+            'time': row.time.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            **({'source_site': row.source_site} if by_site else {}),
+            'count': int(row.count),
+            'price': row.price,
+            'min_price': row.min_price,
+            'max_price': row.max_price,
+        }
+        for row in df.itertuples(index=False)
+    ]
+    return jsonify({'resolution': resolution, 'points': points})
+
+def _fields_arg():
+    """Product columns named by ?fields=, or None for the defaults"""
+    fields = [name.strip() for name in request.args.get('fields', '').split(',') if name.strip()]
+    unknown = [name for name in fields if name not in PRODUCT_COLUMNS]
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(unknown)}")
+    return fields or None
+
+def _limit_arg(default=API_DEFAULT_LIMIT):
+    return max(1, min(request.args.get('limit', default, type=int), API_MAX_LIMIT))
+
+def _encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode('utf-8')).decode('ascii').rstrip('=')
+
+def _cursor_arg(key):
+    """Value stored under key in the opaque ?cursor= token, or None"""
+    token = request.args.get('cursor')
+    if not token:
+        return None
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return int(state[key])
+    except (ValueError, KeyError, TypeError):
+        abort(400, "Invalid cursor")
+
+def _api_etag():
+    """ETag of this API URL at the current table versions
+
+    Reading the versions is one primary key lookup, so a client polling an
+    unchanged resource costs no real query.
+    """
+    versions = sorted(database.table_versions().items())
+    return hashlib.sha1(f'{request.full_path}|{versions}'.encode('utf-8')).hexdigest()
+
+def _api_response(payload, etag):
+    if payload is None:
+        response = Response(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag, weak=True)
+    # Clients may keep the body but must revalidate, which is a cheap 304
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/products')
+def api_products():
+    # /api/products?category=phones&fields=id,title,price&limit=100&cursor=...
+    fields = _fields_arg()
+    etag = _api_etag()
+    if request.if_none_match.contains_weak(etag):
+        return _api_response(None, etag)
     
-    # Generate visualizations
-    visualizations = {}
+    limit = _limit_arg()
+    products = database.page_products(category=request.args.get('category'), limit=limit,
+                                      before_id=_cursor_arg('id'), columns=fields)
+    next_cursor = _encode_cursor({'id': products[-1]['id']}) if len(products) == limit else None
+    if fields and 'id' not in fields:
+        for product in products:
+            del product['id']
+    return _api_response({'products': products, 'next_cursor': next_cursor}, etag)
+
+@app.route('/api/search')
+def api_search():
+    query = request.args.get('q', '')
+    if not query:
+        abort(400, "Missing q")
+    fields = _fields_arg()
+    etag = _api_etag()
+    if request.if_none_match.contains_weak(etag):
+        return _api_response(None, etag)
+    
+    # Results are ranked, so the cursor holds an offset into the ranking
+    limit = _limit_arg(20)
+    offset = _cursor_arg('offset') or 0
+    products = _search(query, limit=limit, columns=fields, offset=offset,
+                       prefix=request.args.get('prefix') in ('1', 'true'))
+    next_cursor = _encode_cursor({'offset': offset + limit}) if len(products) == limit else None
+    return _api_response({'products': products, 'next_cursor': next_cursor}, etag)
+
+@app.route('/api/stats')
+def api_stats():
+    category = request.args.get('category')
+    etag = _api_etag()
+    if request.if_none_match.contains_weak(etag):
+        return _api_response(None, etag)
+    
+    # to_json turns NaN into null and numpy numbers into plain ones
+    prices = json.loads(analytics.price_stats(category=category).to_json(orient='records'))
+    ratings = json.loads(analytics.rating_stats(category=category).to_json(orient='records'))
+    sites = {row['source_site']: row for row in prices}
+    for row in ratings:
+        sites.setdefault(row['source_site'], {'source_site': row['source_site']}).update(
+            rated_count=row['count'], avg_rating=row['avg_rating']
+        )
+    return _api_response({'category': category, 'sites': list(sites.values())}, etag)
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify({'pages': response_cache.stats()})
+
+@app.after_request
+def compress_response(response):
+    """Encode JSON bodies with brotli or gzip when the client accepts it"""
+    if (response.mimetype != 'application/json' or response.is_streamed
+            or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
     
-    if not price_stats.empty:
-        visualizations['price_comparison'] = visualizer.price_comparison(price_stats)
+    if BROTLI_AVAILABLE and request.accept_encodings['br']:
+        import brotli
+        # Quality 5 is close to the best ratio at a fraction of the default's CPU cost
+        data, encoding = brotli.compress(data, quality=5), 'br'
+    elif request.accept_encodings['gzip']:
+        data, encoding = gzip.compress(data, compresslevel=6), 'gzip'
+    else:
+        return response
     
-    if not rating_stats.empty:
-        visualizations['rating_comparison'] = visualizer.rating_comparison(rating_stats)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    # The encoded bytes differ from the plain ones, so the ETag can only be weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def _chart_data(chart, category):
+    """Load the pre-aggregated data plotted by one chart"""
+    if chart == 'price_comparison':
+        return analytics.price_stats(category=category)
+    if chart == 'rating_comparison':
+        return analytics.rating_stats(category=category)
+    if chart == 'price_trends':
+        # Daily averages over live and archived observations
+        return analytics.price_trend(category)
+    # Binned and sampled in SQL over every matching product
+    if chart == 'price_distribution':
+        return database.price_histogram(category)
+    return database.price_rating_summary(category)
+
+@app.route('/visualizations')
+def visualizations():
+    category = request.args.get('category')
     
-    if products:
-        df = pd.DataFrame(products)
-        visualizations['price_distribution'] = visualizer.price_distribution(df)
-        visualizations['price_vs_rating'] = visualizer.price_vs_rating(df)
-        visualizations['price_trends'] = visualizer.price_trends(df)
+    # 'client' draws the charts in the browser from JSON series, 'server'
+    # shows matplotlib images (also the fallback when client drawing fails)
+    render_mode = 'server' if request.args.get('render') == 'server' else 'client'
+    
+    # Only link the charts here; the browser fetches each one from /charts,
+    # so the page no longer waits for matplotlib
+    visualizations = {}
+    if database.get_products(category=category, limit=1, columns=['id']):
+        # The fingerprint in the URL changes with the data, so browsers can
+        # keep each image until something new is scraped
+        fingerprint = database.data_fingerprint(category)
+        for chart in CHART_TYPES:
+            visualizations[chart] = {
+                fmt: url_for('chart_image', chart=chart, fmt=fmt, category=category, v=fingerprint)
+                for fmt in ('png', 'json')
+            }
     
     return render_template('visualizations.html', 
                            visualizations=visualizations, 
-                           category=category)
+                           matched_products=_matched_products(category) if visualizations else [],
+                           category=category,
+                           render_mode=render_mode)
+
+def _matched_products(category, limit=10):
+    """The same products found on several sites, with each site's average price"""
+    groups = {}
+    for row in database.get_matched_prices(category=category, limit=limit).itertuples():
+        group = groups.setdefault(row.group_id, {'title': row.title, 'sites': []})
+        group['sites'].append({'source_site': row.source_site, 'avg_price': row.avg_price,
+                               'observations': row.observations})
+    return list(groups.values())
+
+@app.route('/charts/<chart>.<fmt>')
+def chart_image(chart, fmt):
+    category = request.args.get('category')
+    if chart not in CHART_TYPES or fmt not in CHART_FORMATS:
+        abort(404)
+    
+    fingerprint = database.data_fingerprint(category)
+    etag = hashlib.sha1(f'{chart}|{category}|{fingerprint}|{fmt}'.encode('utf-8')).hexdigest()
+    # Weak comparison, since compressed responses carry a weak ETag
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        # Rendered only after new data has been scraped (see Visualizer.cached_chart)
+        image = visualizer.cached_chart(chart, lambda: _chart_data(chart, category),
+                                        category, fingerprint, fmt)
+        if image is None:
+            abort(404)
+        response = Response(image, mimetype=CHART_FORMATS[fmt])
+    
+    response.set_etag(etag)
+    if request.args.get('v') == fingerprint:
+        response.cache_control.public = True
+        response.cache_control.max_age = 86400
+    else:
+        # Unversioned URLs are revalidated on every use, which is a cheap 304
+        response.cache_control.no_cache = True
+    return response
 
 @app.route('/export')
 def export():
     category = request.args.get('category')
-    filename = database.export_to_excel(category=category)
-    return jsonify({'success': True, 'filename': filename})
+    fmt = request.args.get('format', 'xlsx')
+    try:
+        filename = database.export_products(fmt, category=category)
+        return jsonify({'success': True, 'filename': filename})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
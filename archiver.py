@@ -0,0 +1,211 @@
+import os
+import time
+import sqlite3
+import argparse
+import importlib.util
+from database import unpack_details, refresh_stale_stats
+
+# The archive is optional and needs pyarrow, which is imported on first use
+ARCHIVE_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# Hive-style directory layout: archive/date=2024-01-31/source_site=example.com/
+PARTITION_SCHEMA = [('date', 'string'), ('source_site', 'string')]
+
+ARCHIVE_COLUMNS = ['id', 'title', 'price', 'rating', 'description', 'url', 'image_url',
+                   'category', 'additional_data', 'timestamp', 'created_at']
+
+class Archiver:
+    """Move old product observations from SQLite into a Parquet dataset
+
+    Rows older than the cutoff are written to Parquet files partitioned by
+    scrape date and source_site, then deleted from the products table. The
+    existing triggers keep the search index and aggregate stats in step.
+    """
+
+    def __init__(self, db_path='ecommerce_data.db', archive_dir='archive', batch_size=5000):
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+
+    def _partitioning(self):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in PARTITION_SCHEMA])
+        return ds.partitioning(schema, flavor='hive')
+
+    def _arrow_schema(self):
+        import pyarrow as pa
+
+        return pa.schema([
+            ('id', pa.int64()),
+            ('title', pa.string()),
+            ('price', pa.float64()),
+            ('rating', pa.float64()),
+            ('description', pa.string()),
+            ('url', pa.string()),
+            ('image_url', pa.string()),
+            ('category', pa.string()),
+            ('additional_data', pa.string()),
+            ('timestamp', pa.float64()),
+            ('created_at', pa.string()),
+            ('date', pa.string()),
+            ('source_site', pa.string()),
+        ])
+
+    def archive(self, older_than_days=90):
+        """Archive products scraped more than older_than_days ago, return the row count"""
+        if not ARCHIVE_AVAILABLE:
+            raise RuntimeError("Archiving requires pyarrow to be installed")
+
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        cutoff = time.time() - older_than_days * 86400
+        schema = self._arrow_schema()
+        partitioning = self._partitioning()
+        archived = 0
+
+        # description and additional_data live in product_details, or inline on older rows
+        select = ', '.join(
+            f'COALESCE(d.{name}, p.{name})' if name in ('description', 'additional_data')
+            else f'p.{name}'
+            for name in ARCHIVE_COLUMNS
+        )
+        extra_index = ARCHIVE_COLUMNS.index('additional_data')
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            while True:
+                cursor = conn.execute(f'''
+                SELECT {select},
+                       date(COALESCE(p.timestamp, 0), 'unixepoch') AS date,
+                       COALESCE(p.source_site, '') AS source_site
+                FROM products p
+                LEFT JOIN product_details d ON d.product_id = p.id
+                WHERE p.timestamp < ?
+                ORDER BY p.id
+                LIMIT ?
+                ''', (cutoff, self.batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+
+                columns = [list(column) for column in zip(*rows)]
+                # The archive stores plain JSON; only the live table compresses it
+                columns[extra_index] = [unpack_details(v) for v in columns[extra_index]]
+                table = pa.Table.from_arrays(columns, schema=schema)
+
+                # Files are named after the id range, so re-running a batch that
+                # was written but not yet deleted overwrites instead of duplicating
+                first_id, last_id = rows[0][0], rows[-1][0]
+                ds.write_dataset(
+                    table,
+                    self.archive_dir,
+                    format='parquet',
+                    partitioning=partitioning,
+                    basename_template=f'part-{first_id}-{last_id}-{{i}}.parquet',
+                    existing_data_behavior='overwrite_or_ignore',
+                )
+
+                conn.execute(
+                    'DELETE FROM products WHERE id BETWEEN ? AND ? AND timestamp < ?',
+                    (first_id, last_id, cutoff)
+                )
+                refresh_stale_stats(conn)
+                conn.commit()
+                archived += len(rows)
+        finally:
+            conn.close()
+
+        return archived
+
+    def read(self, columns=None, start=None, end=None, source_site=None, category=None):
+        """Lazily scan the archive into a DataFrame
+
+        Only the requested columns are read. start/end (unix timestamps) and
+        source_site prune whole partitions before any file is opened, and the
+        remaining filters are pushed down to the Parquet row groups.
+        """
+        import pandas as pd
+
+        if not ARCHIVE_AVAILABLE or not os.path.isdir(self.archive_dir):
+            return pd.DataFrame(columns=columns or ARCHIVE_COLUMNS + ['date', 'source_site'])
+
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(self.archive_dir, format='parquet',
+                             partitioning=self._partitioning())
+
+        conditions = []
+        if start is not None:
+            conditions.append(ds.field('date') >= time.strftime('%Y-%m-%d', time.gmtime(start)))
+            conditions.append(ds.field('timestamp') >= start)
+        if end is not None:
+            conditions.append(ds.field('date') <= time.strftime('%Y-%m-%d', time.gmtime(end)))
+            conditions.append(ds.field('timestamp') < end)
+        if source_site:
+            conditions.append(ds.field('source_site') == source_site)
+        if category:
+            conditions.append(ds.field('category') == category)
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        table = dataset.to_table(columns=columns, filter=expression)
+        return table.to_pandas()
+
+    def rollup_rows(self):
+        """Archived prices summed per hour, site and category
+
+        Yields the extra_rows expected by Database.rebuild_rollups, so history
+        archived before the rollups existed can be folded back in.
+        """
+        df = self.read(columns=['timestamp', 'price', 'source_site', 'category'])
+        df = df[df['price'].notna()]
+        if df.empty:
+            return
+        df = df.assign(
+            bucket=(df['timestamp'].fillna(0) // 3600 * 3600).astype('int64'),
+            source_site=df['source_site'].fillna(''),
+            category=df['category'].fillna(''),
+        )
+        hourly = df.groupby(['bucket', 'source_site', 'category'])['price'].agg(
+            ['count', 'sum', 'min', 'max']
+        )
+        for (bucket, source_site, category), row in hourly.iterrows():
+            yield (int(bucket), source_site, category, int(row['count']), float(row['sum']),
+                   float(row['min']), float(row['max']))
+
+
+def main():
+    """Archive old products from the command line, once or on an interval"""
+    parser = argparse.ArgumentParser(description='Archive old products to Parquet')
+    parser.add_argument('--db', default='ecommerce_data.db', help='Path to the SQLite database')
+    parser.add_argument('--archive-dir', default='archive', help='Parquet dataset directory')
+    parser.add_argument('--older-than-days', type=int, default=90,
+                        help='Archive products scraped more than this many days ago')
+    parser.add_argument('--interval', type=int, default=0,
+                        help='Repeat every N seconds instead of running once')
+    parser.add_argument('--rebuild-rollups', action='store_true',
+                        help='Recompute the price rollups from live and archived products')
+    args = parser.parse_args()
+
+    archiver = Archiver(args.db, args.archive_dir)
+    if args.rebuild_rollups:
+        from database import Database
+        Database(args.db).rebuild_rollups(since=0, extra_rows=archiver.rollup_rows())
+        print("✅ Price rollups rebuilt from live and archived products")
+        return
+
+    while True:
+        archived = archiver.archive(args.older_than_days)
+        print(f"📦 Archived {archived} products to {args.archive_dir}/")
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Database layer against a synthetic product catalog
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import platform
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+import numpy as np
+from database import Database
+
+SITES = ['amazon.com', 'ebay.com', 'walmart.com', 'bestbuy.com', 'target.com',
+         'newegg.com', 'etsy.com', 'aliexpress.com']
+
+# category -> (product nouns, brands, median price)
+CATALOG = {
+    'electronics': (['Smartphone', 'Laptop', 'Tablet', 'Headphones', 'Smartwatch', 'Monitor',
+                     'Bluetooth Speaker', 'Camera', 'Charger', 'Keyboard'],
+                    ['Apple', 'Samsung', 'Sony', 'Dell', 'Lenovo', 'Logitech', 'Anker', 'LG'],
+                    250.0),
+    'home': (['Blender', 'Coffee Maker', 'Vacuum Cleaner', 'Air Fryer', 'Desk Lamp', 'Kettle',
+              'Toaster', 'Bed Sheet Set'],
+             ['Philips', 'Dyson', 'Ninja', 'KitchenAid', 'Cuisinart', 'IKEA'],
+             60.0),
+    'clothing': (['T-Shirt', 'Jeans', 'Hoodie', 'Running Shoes', 'Jacket', 'Sneakers', 'Dress'],
+                 ['Nike', 'Adidas', 'Levi\'s', 'Uniqlo', 'Zara', 'Puma'],
+                 35.0),
+    'books': (['Novel', 'Cookbook', 'Biography', 'Textbook', 'Comic', 'Travel Guide'],
+              ['Penguin', 'HarperCollins', 'Vintage', 'O\'Reilly', 'Scholastic'],
+              15.0),
+    'sports': (['Yoga Mat', 'Dumbbell Set', 'Tennis Racket', 'Bicycle Helmet', 'Water Bottle',
+                'Camping Tent'],
+               ['Decathlon', 'Wilson', 'Coleman', 'Garmin', 'Under Armour'],
+               40.0),
+}
+
+ADJECTIVES = ['Pro', 'Max', 'Mini', 'Ultra', 'Lite', 'Plus', 'Classic', 'Wireless', 'Portable',
+              'Premium', 'Compact', 'Smart']
+COLORS = ['Black', 'White', 'Silver', 'Blue', 'Red', 'Green', 'Grey']
+STORAGE = ['64GB', '128GB', '256GB', '512GB', '1TB']
+
+# Plain words from the catalog, used for the search latency queries
+SEARCH_TERMS = sorted({
+    word for nouns, brands, _ in CATALOG.values()
+    for word in re.findall(r'[a-z]{3,}', ' '.join(nouns + brands + ADJECTIVES).lower())
+})
+
+# Cold-start budgets: (statement, seconds including interpreter start-up)
+STARTUP_TARGETS = {
+    'web_app': ('import app', 1.0),
+    'scrape_worker': ('import scraper, database, writer', 0.5),
+}
+
+# Largest catalog the generator is meant for; the report projects how long
+# inserting it would take at the measured rate
+TARGET_ROWS = 10_000_000
+
+# Projected insert times above this are reported as impractical to benchmark
+PRACTICAL_SECONDS = 3600
+
+# Endpoints requested in turn by the serving load test
+LOAD_TEST_PATHS = ['/api/products?limit=20', '/results', '/api/stats']
+
+# Prints the peak RSS of the child after the imports, in kilobytes. VmHWM is
+# per process; ru_maxrss would report the benchmark's own peak, which the
+# child inherits across fork/exec, so it is only a fallback off Linux.
+_RSS_PROBE = '''
+import os, resource
+if os.path.exists('/proc/self/status'):
+    print(next(line.split()[1] for line in open('/proc/self/status') if line.startswith('VmHWM:')))
+else:
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+def generate_products(rows, seed=42, days=90, now=None):
+    """Yield (source_site, category, product) tuples for a reproducible synthetic catalog
+
+    Titles combine brand, product type, model and variant words, prices follow
+    a per-category log-normal distribution, ratings cluster around 4 stars and
+    timestamps are spread over the last `days` days.
+    """
+    rng = random.Random(seed)
+    end = now if now is not None else time.time()
+    categories = list(CATALOG)
+
+    for i in range(rows):
+        site = SITES[min(int(rng.expovariate(0.6)), len(SITES) - 1)]
+        category = rng.choice(categories)
+        nouns, brands, median_price = CATALOG[category]
+        brand = rng.choice(brands)
+        noun = rng.choice(nouns)
+        model = f'{rng.choice("ABCDEFGHKMSXZ")}{rng.randint(1, 99)}'
+        variant = rng.choice(ADJECTIVES)
+        color = rng.choice(COLORS)
+
+        product = {
+            'title': f'{brand} {noun} {model} {variant} {color}',
+            'price': round(median_price * rng.lognormvariate(0, 0.6), 2),
+            'rating': round(min(5.0, max(1.0, rng.gauss(4.1, 0.6))), 1) if rng.random() < 0.85 else None,
+            'description': (f'The {brand} {noun} {model} {variant} in {color.lower()} '
+                            f'is a popular choice for {category} shoppers.'),
+            'url': f'https://www.{site}/p/{i}',
+            'image_url': f'https://www.{site}/images/{i}.jpg',
+            'timestamp': end - rng.random() * days * 86400,
+            'brand': brand,
+            'color': color,
+        }
+        if category == 'electronics':
+            product['storage'] = rng.choice(STORAGE)
+        yield site, category, product
+
+def percentiles(samples):
+    """p50/p95/p99/max of latency samples, in milliseconds"""
+    values = np.array(samples) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3),
+    }
+
+def timed(func, *args, **kwargs):
+    """Run func once and return its wall-clock time in seconds"""
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+def file_size(db_path):
+    """Size of the database file plus its WAL, in bytes"""
+    return sum(os.path.getsize(path) for path in (db_path, db_path + '-wal')
+               if os.path.exists(path))
+
+def git_commit():
+    """Current git commit of the code under test, if known"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def measure_startup(statement, budget, runs=3):
+    """Cold-start time, peak memory and slowest imports of `python -c statement`
+
+    Runs in a scratch directory so importing the app does not touch the
+    working tree, and reports the median of several runs.
+    """
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=project_dir)
+    times = []
+    with tempfile.TemporaryDirectory(prefix='scraper-startup-') as workdir:
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement + _RSS_PROBE],
+                                    cwd=workdir, env=env, capture_output=True, text=True, check=True)
+            times.append(time.perf_counter() - start)
+
+    # "import time: self [us] | cumulative | imported package". Keep the
+    # costliest entry per top-level package, leaving out the modules under test.
+    targets = {name.strip() for name in statement.split('import', 1)[1].split(',')}
+    packages = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and not line.endswith('imported package'):
+            _, cumulative, name = line[len('import time:'):].split('|')
+            package = name.strip().split('.')[0]
+            if package not in targets:
+                packages[package] = max(packages.get(package, 0), int(cumulative) / 1e6)
+    imports = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+    seconds = float(np.median(times))
+    return {
+        'statement': statement,
+        'seconds': round(seconds, 3),
+        'budget_seconds': budget,
+        'within_budget': seconds <= budget,
+        'peak_rss_kb': int(result.stdout.split()[-1]),
+        'slowest_imports': [[name, round(s, 3)] for name, s in imports[:10]],
+    }
+
+def bench_startup():
+    """Cold-start report for each entry in STARTUP_TARGETS"""
+    return {name: measure_startup(statement, budget)
+            for name, (statement, budget) in STARTUP_TARGETS.items()}
+
+def _load_client(port, paths, connections, seconds):
+    """Keep-alive connections requesting paths in turn; returns (latencies, errors)"""
+    import http.client
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run(offset):
+        latencies, errors = [], 0
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        deadline = time.perf_counter() + seconds
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.close()
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        results = list(pool.map(run, range(connections)))
+    return [l for latencies, _ in results for l in latencies], sum(e for _, e in results)
+
+def _wait_for_server(port, process, timeout=60):
+    import urllib.request
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"serve.py exited with status {process.returncode}")
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/stats', timeout=5).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("serve.py did not start in time")
+
+def bench_serving(db_path, workers=(1, 2, 4), seconds=5, connections=16, client_processes=None):
+    """Requests/sec of serve.py on a copy of db_path, for each worker count
+
+    Clients run in their own processes on the same machine, so requests/sec
+    only scales while there are idle cores left for both the workers and
+    the clients.
+    """
+    import socket
+    from concurrent.futures import ProcessPoolExecutor
+
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    client_processes = client_processes or max(1, min(os.cpu_count() or 1, 4))
+    per_process = max(1, connections // client_processes)
+    report = {'cpu_count': os.cpu_count(), 'connections': per_process * client_processes,
+              'client_processes': client_processes, 'seconds': seconds, 'workers': {}}
+
+    with tempfile.TemporaryDirectory(prefix='scraper-serve-') as workdir:
+        # The app opens ecommerce_data.db in its working directory
+        for suffix in ('', '-wal'):
+            if os.path.exists(db_path + suffix):
+                shutil.copy(db_path + suffix, os.path.join(workdir, 'ecommerce_data.db' + suffix))
+
+        for count in workers:
+            with socket.socket() as probe:
+                probe.bind(('127.0.0.1', 0))
+                port = probe.getsockname()[1]
+            process = subprocess.Popen(
+                [sys.executable, os.path.join(project_dir, 'serve.py'), '--workers', str(count),
+                 '--port', str(port)],
+                cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                _wait_for_server(port, process)
+                with ProcessPoolExecutor(max_workers=client_processes) as pool:
+                    # Warm up every worker's caches and connections first
+                    list(pool.map(_load_client, [port] * client_processes,
+                                  [LOAD_TEST_PATHS] * client_processes,
+                                  [per_process] * client_processes, [1] * client_processes))
+                    runs = list(pool.map(_load_client, [port] * client_processes,
+                                         [LOAD_TEST_PATHS] * client_processes,
+                                         [per_process] * client_processes,
+                                         [seconds] * client_processes))
+            finally:
+                process.terminate()
+                process.wait(timeout=60)
+
+            latencies = [l for run_latencies, _ in runs for l in run_latencies]
+            report['workers'][str(count)] = {
+                'requests': len(latencies),
+                'errors': sum(errors for _, errors in runs),
+                'requests_per_second': round(len(latencies) / seconds, 1),
+                'latency': percentiles(latencies) if latencies else None,
+            }
+
+    baseline = report['workers'][str(workers[0])]['requests_per_second']
+    for result in report['workers'].values():
+        result['speedup'] = round(result['requests_per_second'] / baseline, 2) if baseline else None
+    return report
+
+class Benchmark:
+    """Load a synthetic catalog into a fresh database and time the common operations"""
+
+    def __init__(self, db_path, rows=10000, seed=42, batch_size=1000, queries=200,
+                 match_products=True, serve_workers=None, serve_seconds=5):
+        self.db_path = db_path
+        # Worker counts for the serving load test (None skips it)
+        self.serve_workers = serve_workers
+        self.serve_seconds = serve_seconds
+        self.rows = rows
+        self.seed = seed
+        self.batch_size = batch_size
+        self.queries = queries
+        self.match_products = match_products
+        self.database = None
+
+    def run(self):
+        """Run every benchmark and return the report as a dict"""
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+        self.database = Database(self.db_path)
+
+        results = {'insert': self.bench_insert()}
+        if self.match_products:
+            results['matching'] = self.bench_matching()
+        results.update({
+            'search': self.bench_search(),
+            'get_products': self.bench_get_products(),
+            'stats': self.bench_stats(),
+            'export': self.bench_export(),
+            'size': self.bench_size(),
+            'startup': bench_startup(),
+        })
+        if self.serve_workers:
+            # After bench_size, so the copied database is checkpointed
+            results['serving'] = bench_serving(self.db_path, self.serve_workers,
+                                               self.serve_seconds)
+        return {
+            'meta': {
+                'rows': self.rows,
+                'seed': self.seed,
+                'batch_size': self.batch_size,
+                'queries': self.queries,
+                'match_products': self.match_products,
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'results': results,
+        }
+
+    def bench_insert(self):
+        """save_batches throughput, one transaction per batch_size rows"""
+        batch_times = []
+        pending = {}
+        pending_rows = 0
+
+        def flush():
+            batches = [(products, site, category)
+                       for (site, category), products in pending.items()]
+            batch_times.append(timed(self.database.save_batches, batches))
+            pending.clear()
+
+        for site, category, product in generate_products(self.rows, self.seed):
+            pending.setdefault((site, category), []).append(product)
+            pending_rows += 1
+            if pending_rows == self.batch_size:
+                flush()
+                pending_rows = 0
+        if pending:
+            flush()
+
+        total = sum(batch_times)
+        return {
+            'seconds': round(total, 3),
+            'rows_per_second': round(self.rows / total, 1) if total else None,
+            # Optimistic: the insert rate drops as the indexes grow
+            'projected_target_seconds': round(TARGET_ROWS * total / self.rows) if total else None,
+            'batch': percentiles(batch_times),
+        }
+
+    def bench_matching(self):
+        """Throughput of the deferred cross-site matching over the inserted rows"""
+        batch_times = []
+        while True:
+            start = time.perf_counter()
+            count = self.database.match_pending(self.batch_size)
+            if not count:
+                break
+            batch_times.append(time.perf_counter() - start)
+
+        total = sum(batch_times)
+        return {
+            'seconds': round(total, 3),
+            'rows_per_second': round(self.rows / total, 1) if total else None,
+            'batch': percentiles(batch_times),
+        }
+
+    def bench_search(self):
+        """search_products latency for one- and two-word queries"""
+        rng = random.Random(self.seed + 1)
+        plain, prefix = [], []
+        for _ in range(self.queries):
+            words = rng.sample(SEARCH_TERMS, rng.choice((1, 2)))
+            plain.append(timed(self.database.search_products, ' '.join(words)))
+            prefix.append(timed(self.database.search_products, words[0][:3], limit=10, prefix=True))
+        return {'query': percentiles(plain), 'prefix': percentiles(prefix)}
+
+    def bench_get_products(self):
+        """get_products latency: newest page, per category and by indexed attribute"""
+        rng = random.Random(self.seed + 2)
+        latest, by_category, by_attribute = [], [], []
+        for _ in range(self.queries):
+            latest.append(timed(self.database.get_products))
+            by_category.append(timed(self.database.get_products, category=rng.choice(list(CATALOG))))
+            brand = rng.choice(CATALOG['electronics'][1])
+            by_attribute.append(timed(self.database.get_products, attributes={'brand': brand}))
+        return {
+            'latest': percentiles(latest),
+            'category': percentiles(by_category),
+            'attribute': percentiles(by_attribute),
+        }
+
+    def bench_stats(self):
+        """Time of the aggregate stats queries behind the dashboard"""
+        rounds = max(1, self.queries // 10)
+        # Untimed first calls, so importing pandas is not part of the samples
+        self.database.get_price_stats()
+        self.database.get_rating_stats()
+        price = [timed(self.database.get_price_stats) for _ in range(rounds)]
+        rating = [timed(self.database.get_rating_stats) for _ in range(rounds)]
+        return {'price_stats': percentiles(price), 'rating_stats': percentiles(rating)}
+
+    def bench_export(self):
+        """Full export time and output size for every available format"""
+        from exporter import PARQUET_AVAILABLE
+        formats = ['csv', 'ndjson'] + (['parquet'] if PARQUET_AVAILABLE else [])
+        if importlib.util.find_spec('openpyxl') is not None:
+            formats.append('xlsx')
+        results = {}
+        for fmt in formats:
+            start = time.perf_counter()
+            filename = self.database.export_products(fmt, f'benchmark.{fmt}')
+            seconds = time.perf_counter() - start
+            results[fmt] = {'seconds': round(seconds, 3), 'bytes': os.path.getsize(filename)}
+            os.remove(filename)
+        return results
+
+    def bench_size(self):
+        """Database size on disk, before and after a WAL checkpoint"""
+        before = file_size(self.db_path)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        finally:
+            conn.close()
+        after = file_size(self.db_path)
+        return {'bytes': before, 'checkpointed_bytes': after,
+                'bytes_per_row': round(after / self.rows, 1) if self.rows else None}
+
+def _flatten(report, prefix=''):
+    """Flatten nested result dicts into {'search.query.p50_ms': value}"""
+    values = {}
+    for key, value in report.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            values.update(_flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+def compare(baseline, current):
+    """Print every metric of two reports side by side with the relative change"""
+    for label, report in (('baseline', baseline), ('current', current)):
+        meta = report['meta']
+        print(f"{label:>8}: {meta['rows']} rows, commit {meta['commit']}, {meta['created']}")
+    if baseline['meta']['rows'] != current['meta']['rows']:
+        print("⚠️  Reports were run with different row counts")
+
+    before = _flatten(baseline['results'])
+    after = _flatten(current['results'])
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name], after[name]
+        change = f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+        print(f'{name:<40} {old:>14} {new:>14} {change:>9}')
+
+
+def main():
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description='Benchmark the scrape database')
+    parser.add_argument('--rows', type=int, default=10000, help='Synthetic products to insert')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the catalog')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per insert transaction')
+    parser.add_argument('--queries', type=int, default=200, help='Samples per latency benchmark')
+    parser.add_argument('--no-matching', action='store_true',
+                        help='Skip the cross-site matching benchmark')
+    parser.add_argument('--db', help='Database file to create (default: a temporary file)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--load-test', metavar='WORKERS', nargs='?', const='1,2,4',
+                        help='Also load test serve.py with these worker counts (default: 1,2,4)')
+    parser.add_argument('--load-seconds', type=float, default=5,
+                        help='Seconds of load per worker count')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='Compare the new report against an earlier JSON report')
+    args = parser.parse_args()
+
+    workdir = None
+    db_path = args.db
+    if db_path is None:
+        workdir = tempfile.mkdtemp(prefix='scraper-bench-')
+        db_path = os.path.join(workdir, 'benchmark.db')
+
+    print(f"⏱️  Benchmarking {args.rows} rows in {db_path}")
+    try:
+        serve_workers = [int(n) for n in args.load_test.split(',')] if args.load_test else None
+        report = Benchmark(db_path, rows=args.rows, seed=args.seed, batch_size=args.batch_size,
+                           queries=args.queries, match_products=not args.no_matching,
+                           serve_workers=serve_workers, serve_seconds=args.load_seconds).run()
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"✅ Report written to {args.output}")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+    insert = report['results']['insert']
+    projected = insert['projected_target_seconds']
+    if projected:
+        print(f"📈 At {insert['rows_per_second']} rows/s, inserting {TARGET_ROWS:,} rows would "
+              f"take at least {projected / 60:.0f} minutes")
+        if projected > PRACTICAL_SECONDS:
+            print(f"⚠️  {TARGET_ROWS:,} rows are out of reach at this insert rate; benchmark "
+                  f"smaller catalogs and compare the trend")
+
+    serving = report['results'].get('serving')
+    if serving:
+        print(f"🌐 Serving load test on {serving['cpu_count']} CPU cores:")
+        for count, result in serving['workers'].items():
+            print(f"   {count} workers: {result['requests_per_second']} requests/s "
+                  f"(x{result['speedup']}), {result['errors']} errors")
+        if max(int(count) for count in serving['workers']) > serving['cpu_count']:
+            print("⚠️  More workers than CPU cores: the extra workers cannot add throughput")
+
+    over_budget = False
+    for name, startup in report['results']['startup'].items():
+        if not startup['within_budget']:
+            over_budget = True
+            print(f"⚠️  {name} cold start took {startup['seconds']}s, "
+                  f"over its {startup['budget_seconds']}s budget")
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,18 +1,357 @@
 import sqlite3
-import pandas as pd
 import os
+import re
+import math
 import json
+import zlib
+import threading
+import argparse
+from matching import ProductMatcher
+
+# Day bucket (UTC) that a product row is aggregated into
+_STATS_DAY = "date(COALESCE({row}.timestamp, 0), 'unixepoch')"
+
+# Aggregate product rows into one daily_site_stats row per (site, category, day)
+_STATS_SELECT = '''
+    SELECT
+        COALESCE(source_site, ''),
+        COALESCE(category, ''),
+        {day},
+        COUNT(*),
+        COUNT(price),
+        COALESCE(SUM(price), 0),
+        MIN(price),
+        MAX(price),
+        COUNT(rating),
+        COALESCE(SUM(rating), 0)
+    FROM products
+    WHERE {where}
+    GROUP BY 1, 2, 3
+'''
+
+# Fold the rows saved by one save_batches() call into daily_site_stats: one
+# aggregated UPSERT per transaction instead of one per row
+_STATS_ADD_BATCH = '''
+    INSERT INTO daily_site_stats
+        (source_site, category, day, product_count, price_count, price_sum,
+         min_price, max_price, rating_count, rating_sum)
+    {select}
+    ON CONFLICT (source_site, category, day) DO UPDATE SET
+        product_count = product_count + excluded.product_count,
+        price_count = price_count + excluded.price_count,
+        price_sum = price_sum + excluded.price_sum,
+        min_price = MIN(COALESCE(min_price, excluded.min_price),
+                        COALESCE(excluded.min_price, min_price)),
+        max_price = MAX(COALESCE(max_price, excluded.max_price),
+                        COALESCE(excluded.max_price, max_price)),
+        rating_count = rating_count + excluded.rating_count,
+        rating_sum = rating_sum + excluded.rating_sum
+'''.format(select=_STATS_SELECT.format(day=_STATS_DAY.format(row='products'),
+                                       where='id BETWEEN ? AND ?'))
+
+# Single-row edits and deletes are kept in sync by triggers. An update folds
+# the new values in with an UPSERT. Deletes subtract the row; a min or max
+# cannot be decremented, so when the removed price was one of them the bucket
+# is only flagged and refresh_stale_stats() rescans it once per batch.
+_STATS_ADD_ROW = '''
+    INSERT INTO daily_site_stats
+        (source_site, category, day, product_count, price_count, price_sum,
+         min_price, max_price, rating_count, rating_sum)
+    VALUES (
+        COALESCE(NEW.source_site, ''), COALESCE(NEW.category, ''), {day},
+        1, NEW.price IS NOT NULL, COALESCE(NEW.price, 0), NEW.price, NEW.price,
+        NEW.rating IS NOT NULL, COALESCE(NEW.rating, 0)
+    )
+    ON CONFLICT (source_site, category, day) DO UPDATE SET
+        product_count = product_count + 1,
+        price_count = price_count + excluded.price_count,
+        price_sum = price_sum + excluded.price_sum,
+        min_price = MIN(COALESCE(min_price, excluded.min_price),
+                        COALESCE(excluded.min_price, min_price)),
+        max_price = MAX(COALESCE(max_price, excluded.max_price),
+                        COALESCE(excluded.max_price, max_price)),
+        rating_count = rating_count + excluded.rating_count,
+        rating_sum = rating_sum + excluded.rating_sum;
+'''.format(day=_STATS_DAY.format(row='NEW'))
+
+_STATS_REMOVE_ROW = '''
+    UPDATE daily_site_stats SET
+        product_count = product_count - 1,
+        price_count = price_count - (OLD.price IS NOT NULL),
+        price_sum = price_sum - COALESCE(OLD.price, 0),
+        rating_count = rating_count - (OLD.rating IS NOT NULL),
+        rating_sum = rating_sum - COALESCE(OLD.rating, 0)
+    WHERE source_site = COALESCE(OLD.source_site, '')
+      AND category = COALESCE(OLD.category, '')
+      AND day = {day};
+
+    DELETE FROM daily_site_stats
+    WHERE source_site = COALESCE(OLD.source_site, '')
+      AND category = COALESCE(OLD.category, '')
+      AND day = {day}
+      AND product_count <= 0;
+
+    UPDATE daily_site_stats SET minmax_stale = 1
+    WHERE source_site = COALESCE(OLD.source_site, '')
+      AND category = COALESCE(OLD.category, '')
+      AND day = {day}
+      AND (OLD.price = min_price OR OLD.price = max_price);
+'''.format(day=_STATS_DAY.format(row='OLD'))
+
+# Bucket sizes (seconds) of the stored price rollups. Coarser resolutions are
+# grouped from the daily rows when queried.
+ROLLUP_RESOLUTIONS = {'hour': 3600, 'day': 86400}
+SERIES_RESOLUTIONS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400, 'month': 30 * 86400}
+
+# Start of the week (Monday, UTC) or month that a daily bucket falls in
+_SERIES_BUCKET = {
+    'hour': 'bucket',
+    'day': 'bucket',
+    'week': 'bucket - ((bucket / 86400 + 3) % 7) * 86400',
+    'month': "CAST(strftime('%s', bucket, 'unixepoch', 'start of month') AS INTEGER)",
+}
+
+# Fold the priced rows saved by one save_batches() call into their hourly and
+# daily price_rollups rows, one grouped UPSERT per resolution. Rollups only
+# ever grow: archiving or pruning products keeps their history.
+_ROLLUP_ADD_BATCH = ['''
+    INSERT INTO price_rollups
+        (resolution, bucket, source_site, category, price_count, price_sum, min_price, max_price)
+    SELECT '{name}', CAST(COALESCE(timestamp, 0) / {seconds} AS INTEGER) * {seconds},
+           COALESCE(source_site, ''), COALESCE(category, ''),
+           COUNT(*), SUM(price), MIN(price), MAX(price)
+    FROM products
+    WHERE id BETWEEN ? AND ? AND price IS NOT NULL
+    GROUP BY 2, 3, 4
+    ON CONFLICT (resolution, bucket, source_site, category) DO UPDATE SET
+        price_count = price_count + excluded.price_count,
+        price_sum = price_sum + excluded.price_sum,
+        min_price = MIN(min_price, excluded.min_price),
+        max_price = MAX(max_price, excluded.max_price)
+'''.format(name=name, seconds=seconds) for name, seconds in ROLLUP_RESOLUTIONS.items()]
+
+# Tables whose writes bump a counter in table_versions, so readers (e.g. API
+# ETags) can tell whether anything changed with a single primary key lookup
+VERSIONED_TABLES = ('products', 'product_details')
+
+_VERSION_TRIGGERS = ''.join(f'''
+CREATE TRIGGER IF NOT EXISTS {table}_version_{suffix} AFTER {operation} ON {table}
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+END;
+''' for table in VERSIONED_TABLES
+    for suffix, operation in (('ai', 'INSERT'), ('au', 'UPDATE'), ('ad', 'DELETE')))
+
+# Preset dictionary for compressing additional_data. Scraped JSON is small
+# and repetitive, so priming zlib with the usual keys and URL fragments lets
+# even short blobs compress well. Never edit it in place: stored blobs need
+# the exact bytes they were written with, so add a new version instead.
+DETAILS_ZDICT_V1 = (
+    b'{"specifications": {"images": ["https://www.", ".com/", "/images/", ".jpg", '
+    b'".png", ".webp", "?width=", "Brand", "Model", "Color", "Colour", "Size", '
+    b'"Storage", "Memory", "RAM", "Capacity", "Weight", "Dimensions", "Material", '
+    b'"Warranty", "Manufacturer", "Display", "Screen Size", "Battery", "Processor", '
+    b'"Operating System", "brand": "model": "storage": "color": "sku": "GB", "TB", '
+    b'"inches", "cm", "mm", "kg", "lbs", "Black", "White", "Silver", "Blue", "Red", '
+    b'"Yes", "No", "N/A", null, true, false}'
+)
+
+def pack_details(text):
+    """Compress a details string for storage in product_details"""
+    if text is None:
+        return None
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS, zdict=DETAILS_ZDICT_V1)
+    return b'\x01' + compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+def refresh_stale_stats(conn):
+    """Recompute min/max of the daily_site_stats buckets flagged by deletes
+
+    Bulk deletes call this once per batch, so each affected bucket is
+    rescanned once rather than once per removed row. Returns the number of
+    buckets refreshed.
+    """
+    days = [row[0] for row in conn.execute(
+        'SELECT DISTINCT day FROM daily_site_stats WHERE minmax_stale'
+    )]
+    refreshed = 0
+    for day in days:
+        cursor = conn.execute('''
+        UPDATE daily_site_stats SET
+            min_price = bucket.min_price,
+            max_price = bucket.max_price,
+            minmax_stale = 0
+        FROM (
+            SELECT COALESCE(source_site, '') AS source_site,
+                   COALESCE(category, '') AS category,
+                   MIN(price) AS min_price, MAX(price) AS max_price
+            FROM products
+            WHERE timestamp >= CAST(strftime('%s', ?1) AS REAL)
+              AND timestamp < CAST(strftime('%s', ?1, '+1 day') AS REAL)
+            GROUP BY 1, 2
+        ) AS bucket
+        WHERE daily_site_stats.day = ?1 AND daily_site_stats.minmax_stale
+          AND daily_site_stats.source_site = bucket.source_site
+          AND daily_site_stats.category = bucket.category
+        ''', (day,))
+        refreshed += cursor.rowcount
+    return refreshed
+
+def unpack_details(blob):
+    """Inverse of pack_details; plain text from older rows passes through unchanged"""
+    if blob is None or isinstance(blob, str):
+        return blob
+    if blob[:1] == b'\x01':
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS, zdict=DETAILS_ZDICT_V1)
+        return (decompressor.decompress(blob[1:]) + decompressor.flush()).decode('utf-8')
+    raise ValueError(f"Unknown details encoding: {blob[:1]!r}")
+
+# Columns get_products() and search_products() can return. description and
+# additional_data live in product_details and are only joined when requested;
+# rows saved before the side table existed still carry them inline.
+PRODUCT_COLUMNS = {
+    'id': 'p.id',
+    'title': 'p.title',
+    'price': 'p.price',
+    'rating': 'p.rating',
+    'url': 'p.url',
+    'image_url': 'p.image_url',
+    'source_site': 'p.source_site',
+    'category': 'p.category',
+    'timestamp': 'p.timestamp',
+    'created_at': 'p.created_at',
+    'description': 'COALESCE(d.description, p.description)',
+    'additional_data': 'COALESCE(d.additional_data, p.additional_data)',
+}
+DETAIL_COLUMNS = ('description', 'additional_data')
+DEFAULT_COLUMNS = [name for name in PRODUCT_COLUMNS if name not in DETAIL_COLUMNS]
+
+# additional_data keys copied into indexed columns (name -> JSON path).
+# Each becomes a column attr_<name>, filled from the JSON when a row is saved.
+INDEXED_ATTRIBUTES = {
+    'brand': '$.brand',
+    'storage': '$.storage',
+}
+
+# Relative bm25() weights for the title, description and category columns
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0)
+
+# Keep product_search in sync. The FTS table is external content over the
+# product_search_content view, so it stores only the index and deletes must
+# supply the old values. New rows are indexed once their product_details row
+# (which carries the description) is written.
+_SEARCH_TRIGGERS = '''
+CREATE TRIGGER IF NOT EXISTS product_details_search_ai AFTER INSERT ON product_details
+BEGIN
+    INSERT INTO product_search (rowid, title, description, category)
+    SELECT id, title, NEW.description, category FROM products WHERE id = NEW.product_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS product_details_search_au
+AFTER UPDATE OF description ON product_details
+BEGIN
+    INSERT INTO product_search (product_search, rowid, title, description, category)
+    SELECT 'delete', id, title, OLD.description, category FROM products WHERE id = OLD.product_id;
+    INSERT INTO product_search (rowid, title, description, category)
+    SELECT id, title, NEW.description, category FROM products WHERE id = NEW.product_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_search_ad AFTER DELETE ON products
+BEGIN
+    INSERT INTO product_search (product_search, rowid, title, description, category)
+    VALUES ('delete', OLD.id, OLD.title,
+            COALESCE((SELECT description FROM product_details WHERE product_id = OLD.id),
+                     OLD.description),
+            OLD.category);
+    DELETE FROM product_details WHERE product_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_search_au AFTER UPDATE OF title, category ON products
+BEGIN
+    INSERT INTO product_search (product_search, rowid, title, description, category)
+    VALUES ('delete', OLD.id, OLD.title,
+            COALESCE((SELECT description FROM product_details WHERE product_id = OLD.id),
+                     OLD.description),
+            OLD.category);
+    INSERT INTO product_search (rowid, title, description, category)
+    VALUES (NEW.id, NEW.title,
+            COALESCE((SELECT description FROM product_details WHERE product_id = NEW.id),
+                     NEW.description),
+            NEW.category);
+END;
+'''
+
+# Record price/rating changes against the previous observation of the same
+# product_key. A missing value on the new row is treated as unknown rather
+# than as a change, so a failed price parse does not show up in the feed.
+_CHANGES_TRIGGER = '''
+CREATE TRIGGER IF NOT EXISTS products_changes_ai AFTER INSERT ON products
+BEGIN
+    INSERT INTO product_changes
+        (product_id, previous_id, product_key, source_site, title,
+         old_price, new_price, old_rating, new_rating, detected_at)
+    SELECT
+        NEW.id, prev.id, NEW.product_key, NEW.source_site, NEW.title,
+        prev.price, NEW.price, prev.rating, NEW.rating, NEW.timestamp
+    FROM (
+        SELECT id, price, rating FROM products
+        WHERE product_key = NEW.product_key AND id < NEW.id
+        ORDER BY id DESC
+        LIMIT 1
+    ) prev
+    WHERE (NEW.price IS NOT NULL AND NEW.price IS NOT prev.price)
+       OR (NEW.rating IS NOT NULL AND NEW.rating IS NOT prev.rating);
+END;
+
+CREATE TRIGGER IF NOT EXISTS product_changes_no_update BEFORE UPDATE ON product_changes
+BEGIN
+    SELECT RAISE(ABORT, 'product_changes is append-only');
+END;
+'''
 
 class Database:
-    def __init__(self, db_path='ecommerce_data.db'):
+    def __init__(self, db_path='ecommerce_data.db', indexed_attributes=None):
         self.db_path = db_path
-        self.conn = None
-        self.cursor = None
+        self._matcher = None
+        self.indexed_attributes = dict(
+            INDEXED_ATTRIBUTES if indexed_attributes is None else indexed_attributes
+        )
+        for name in self.indexed_attributes:
+            if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', name):
+                raise ValueError(f"Invalid attribute name: {name}")
+        # Connections are per thread, so the writer thread and request threads
+        # can share one Database
+        self._local = threading.local()
         self.initialize_db()
     
+    @property
+    def conn(self):
+        return getattr(self._local, 'conn', None)
+
+    @conn.setter
+    def conn(self, value):
+        self._local.conn = value
+
+    @property
+    def cursor(self):
+        return getattr(self._local, 'cursor', None)
+
+    @cursor.setter
+    def cursor(self, value):
+        self._local.cursor = value
+
+    @property
+    def matcher(self):
+        """ProductMatcher used by match_pending(), created on first use"""
+        if self._matcher is None:
+            self._matcher = ProductMatcher()
+        return self._matcher
+
     def connect(self):
         """Connect to the SQLite database"""
-        self.conn = sqlite3.connect(self.db_path)
+        # Wait for a busy writer instead of failing with "database is locked"
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        # Lets SQL (e.g. attribute filters) read compressed additional_data
+        self.conn.create_function('unpack_details', 1, unpack_details, deterministic=True)
         self.cursor = self.conn.cursor()
         return self.conn
     
@@ -26,6 +365,13 @@ class Database:
     def initialize_db(self):
         """Create the database tables if they don't exist"""
         self.connect()
+
+        # Lets the retention job hand free pages back to the OS in small steps.
+        # Only takes effect on new databases; see RetentionPolicy for existing ones.
+        self.cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+
+        # WAL lets readers keep going while the writer thread commits
+        self.cursor.execute('PRAGMA journal_mode = WAL')
         
         # Create products table
         self.cursor.execute('''
@@ -45,19 +391,575 @@ class Database:
         )
         ''')
         
-        # Create a search index
+        self._create_details_table()
+        self._create_search_index()
+
+        # Used by the stats triggers to rescan a single (site, category, day)
+        self.cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_site_category_time
+        ON products (source_site, category, timestamp)
+        ''')
+
+        # Lets paged listings of one category walk the index in id order
+        self.cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_category ON products (category)
+        ''')
+
+        # Used by the archiver and retention jobs to find old observations
+        self.cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_timestamp ON products (timestamp)
+        ''')
+
+        # Daily per-product summaries of observations past the retention window
         self.cursor.execute('''
-        CREATE VIRTUAL TABLE IF NOT EXISTS product_search 
-        USING fts5(title, description, category)
+        CREATE TABLE IF NOT EXISTS product_daily_prices (
+            source_site TEXT NOT NULL,
+            product_key TEXT NOT NULL,
+            day TEXT NOT NULL,
+            title TEXT,
+            category TEXT,
+            observations INTEGER NOT NULL,
+            price_count INTEGER NOT NULL,
+            min_price REAL,
+            avg_price REAL,
+            max_price REAL,
+            rating_count INTEGER NOT NULL,
+            avg_rating REAL,
+            PRIMARY KEY (source_site, product_key, day)
+        ) WITHOUT ROWID
         ''')
+
+        self._create_stats_tables()
+        self._create_rollup_tables()
+        self._create_attribute_columns()
+        ProductMatcher.create_tables(self.cursor)
+        self._create_change_feed()
+        self._create_version_counters()
         
         self.conn.commit()
         self.disconnect()
+
+    def _table_exists(self, name):
+        """Check whether a table exists in the connected database"""
+        self.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        )
+        return self.cursor.fetchone() is not None
+
+    def _create_details_table(self):
+        """Create the side table holding descriptions and compressed additional_data"""
+        # Kept out of products so list and stats queries never read these large
+        # values. description stays plain text because the FTS index reads it.
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_details (
+            product_id INTEGER PRIMARY KEY,
+            description TEXT,
+            additional_data BLOB
+        )
+        ''')
+
+        self.cursor.execute('''
+        CREATE VIEW IF NOT EXISTS product_search_content AS
+        SELECT p.id AS id, p.title AS title,
+               COALESCE(d.description, p.description) AS description,
+               p.category AS category
+        FROM products p
+        LEFT JOIN product_details d ON d.product_id = p.id
+        ''')
+
+    def _create_attribute_columns(self):
+        """Add indexed columns for the configured additional_data keys"""
+        # table_xinfo (unlike table_info) also lists generated columns;
+        # hidden = 2 or 3 marks a generated one
+        self.cursor.execute('PRAGMA table_xinfo(products)')
+        existing = {row[1]: row[6] for row in self.cursor.fetchall()}
+
+        for name, path in self.indexed_attributes.items():
+            column = f'attr_{name}'
+            index = f'idx_products_{column}'
+
+            # Earlier versions derived these as generated columns over the inline
+            # JSON, which no longer works once additional_data is compressed
+            if existing.get(column) in (2, 3):
+                self.cursor.execute(f'DROP INDEX IF EXISTS {index}')
+                self.cursor.execute(f'ALTER TABLE products DROP COLUMN {column}')
+                del existing[column]
+
+            if column not in existing:
+                # No declared type, so numbers and strings keep their JSON types
+                self.cursor.execute(f'ALTER TABLE products ADD COLUMN {column}')
+                self.cursor.execute(
+                    f'UPDATE products SET {column} = json_extract(additional_data, ?) '
+                    'WHERE additional_data IS NOT NULL',
+                    (path,)
+                )
+            self.cursor.execute(f'CREATE INDEX IF NOT EXISTS {index} ON products ({column})')
+
+    def _create_change_feed(self):
+        """Create the product_key column and the append-only product_changes feed"""
+        self.cursor.execute('PRAGMA table_xinfo(products)')
+        if 'product_key' not in {row[1] for row in self.cursor.fetchall()}:
+            # The same product on the same site: its URL, or its title when there is none
+            self.cursor.execute('''
+            ALTER TABLE products ADD COLUMN product_key TEXT GENERATED ALWAYS AS (
+                COALESCE(source_site, '') || '|' || COALESCE(NULLIF(url, ''), title)
+            ) VIRTUAL
+            ''')
+        self.cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_products_product_key ON products (product_key)'
+        )
+
+        # AUTOINCREMENT guarantees seq is never reused, even after rows are pruned
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            previous_id INTEGER NOT NULL,
+            product_key TEXT NOT NULL,
+            source_site TEXT,
+            title TEXT,
+            old_price REAL,
+            new_price REAL,
+            old_rating REAL,
+            new_rating REAL,
+            detected_at REAL
+        )
+        ''')
+        self.cursor.executescript(_CHANGES_TRIGGER)
+
+    def changes_since(self, seq=0, limit=1000):
+        """Price/rating changes with a sequence number greater than seq, oldest first"""
+        self.connect()
+
+        self.cursor.execute('''
+        SELECT * FROM product_changes
+        WHERE seq > ?
+        ORDER BY seq
+        LIMIT ?
+        ''', (seq, limit))
+        results = self.cursor.fetchall()
+
+        # Convert to list of dictionaries
+        columns = [desc[0] for desc in self.cursor.description]
+        changes = [dict(zip(columns, row)) for row in results]
+
+        self.disconnect()
+        return changes
+
+    def _create_version_counters(self):
+        """Create table_versions and the triggers that count writes per table"""
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        self.cursor.executemany('INSERT OR IGNORE INTO table_versions (name) VALUES (?)',
+                                [(table,) for table in VERSIONED_TABLES])
+        self.cursor.executescript(_VERSION_TRIGGERS)
+
+    def table_versions(self, *tables):
+        """Write counters of the given tables (default: all), e.g. {'products': 42}
+
+        A counter only ever grows, so an unchanged value means the table has
+        not been written since it was last read.
+        """
+        tables = tables or VERSIONED_TABLES
+        self.connect()
+        placeholders = ', '.join('?' * len(tables))
+        self.cursor.execute(
+            f'SELECT name, version FROM table_versions WHERE name IN ({placeholders})', tables
+        )
+        versions = dict(self.cursor.fetchall())
+        self.disconnect()
+        return versions
+
+    def _attribute_filters(self, attributes):
+        """WHERE conditions and parameters for additional_data attribute filters"""
+        conditions = []
+        params = []
+        for name, value in (attributes or {}).items():
+            if name in self.indexed_attributes:
+                conditions.append(f'p.attr_{name} = ?')
+            else:
+                # Not indexed: still works, but decompresses the JSON for every row
+                conditions.append(
+                    'json_extract(unpack_details(COALESCE('
+                    '(SELECT additional_data FROM product_details WHERE product_id = p.id), '
+                    'p.additional_data)), ?) = ?'
+                )
+                params.append(f'$.{name}')
+            params.append(value)
+        return conditions, params
+
+    def _create_search_index(self):
+        """Create the external-content FTS5 index over product_search_content"""
+        self.cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'product_search'"
+        )
+        row = self.cursor.fetchone()
+        needs_rebuild = row is None
+
+        # Older databases kept a standalone FTS table with its own copy of the
+        # text, or an index over products alone. Replace either with an index
+        # that reads from product_search_content.
+        if row is not None and "content='product_search_content'" not in row[0]:
+            self.cursor.execute('DROP TABLE product_search')
+            for trigger in ('products_search_ai', 'products_search_ad', 'products_search_au'):
+                self.cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            needs_rebuild = True
+
+        # prefix='2 3' adds prefix indexes so type-ahead queries like "iph*"
+        # are index lookups rather than full term scans
+        self.cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS product_search
+        USING fts5(
+            title, description, category,
+            content='product_search_content', content_rowid='id',
+            prefix='2 3'
+        )
+        ''')
+        self.cursor.executescript(_SEARCH_TRIGGERS)
+
+        if needs_rebuild:
+            self.cursor.execute(
+                "INSERT INTO product_search (product_search) VALUES ('rebuild')"
+            )
+
+    def rebuild_search_index(self):
+        """Rebuild the full-text index from the products table"""
+        self.connect()
+        self.cursor.execute("INSERT INTO product_search (product_search) VALUES ('rebuild')")
+        self.conn.commit()
+        self.disconnect()
+
+    def optimize_search_index(self, pages_per_step=500):
+        """Merge the full-text index b-trees in small committed steps
+
+        Each step merges at most pages_per_step pages and commits, so
+        concurrent writers only ever wait for a single short transaction.
+        Returns the number of steps that were run.
+        """
+        self.connect()
+        steps = 0
+        while True:
+            changes_before = self.conn.total_changes
+            self.cursor.execute(
+                "INSERT INTO product_search (product_search, rank) VALUES ('merge', ?)",
+                (pages_per_step,)
+            )
+            self.conn.commit()
+            steps += 1
+            # FTS5 reports fewer than two changes once nothing is left to merge
+            if self.conn.total_changes - changes_before < 2:
+                break
+        self.disconnect()
+        return steps
+
+    def _create_stats_tables(self):
+        """Create the daily aggregate table and the triggers that maintain it"""
+        needs_backfill = not self._table_exists('daily_site_stats')
+
+        # One row per (source_site, category, day). Sums and counts are kept
+        # instead of averages so buckets can be merged and decremented.
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_site_stats (
+            source_site TEXT NOT NULL,
+            category TEXT NOT NULL,
+            day TEXT NOT NULL,
+            product_count INTEGER NOT NULL DEFAULT 0,
+            price_count INTEGER NOT NULL DEFAULT 0,
+            price_sum REAL NOT NULL DEFAULT 0,
+            min_price REAL,
+            max_price REAL,
+            rating_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum REAL NOT NULL DEFAULT 0,
+            minmax_stale INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (source_site, category, day)
+        ) WITHOUT ROWID
+        ''')
+
+        self.cursor.execute('PRAGMA table_info(daily_site_stats)')
+        if 'minmax_stale' not in {row[1] for row in self.cursor.fetchall()}:
+            self.cursor.execute(
+                'ALTER TABLE daily_site_stats ADD COLUMN minmax_stale INTEGER NOT NULL DEFAULT 0'
+            )
+        self.cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_daily_site_stats_stale
+        ON daily_site_stats (day) WHERE minmax_stale
+        ''')
+
+        # Inserts are folded in per batch by save_batches (_STATS_ADD_BATCH);
+        # earlier versions did it with a per-row trigger. The delete and update
+        # triggers are recreated because older ones rescanned the bucket per row.
+        self.cursor.executescript(f'''
+        DROP TRIGGER IF EXISTS products_stats_ai;
+        DROP TRIGGER IF EXISTS products_stats_ad;
+        DROP TRIGGER IF EXISTS products_stats_au;
+
+        CREATE TRIGGER products_stats_ad AFTER DELETE ON products
+        BEGIN {_STATS_REMOVE_ROW} END;
+
+        CREATE TRIGGER products_stats_au
+        AFTER UPDATE OF price, rating, source_site, category, timestamp ON products
+        BEGIN {_STATS_REMOVE_ROW} {_STATS_ADD_ROW} END;
+        ''')
+
+        # Databases created before the aggregate table existed need a backfill
+        if needs_backfill:
+            self._rebuild_stats()
+
+    def _rebuild_stats(self):
+        """Recompute daily_site_stats from the products table"""
+        self.cursor.execute('DELETE FROM daily_site_stats')
+        self.cursor.execute('''
+        INSERT INTO daily_site_stats
+            (source_site, category, day, product_count, price_count, price_sum,
+             min_price, max_price, rating_count, rating_sum)
+        ''' + _STATS_SELECT.format(day=_STATS_DAY.format(row='products'), where='1'))
+
+    def rebuild_stats(self):
+        """Rebuild the aggregate stats tables from scratch"""
+        self.connect()
+        self._rebuild_stats()
+        self.conn.commit()
+        self.disconnect()
+
+    def _create_rollup_tables(self):
+        """Create the hourly/daily price rollups table"""
+        needs_backfill = not self._table_exists('price_rollups')
+
+        # Sums and counts rather than averages, so buckets can be merged into
+        # coarser ones. Time comes first in the key because every read is a
+        # date range.
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_rollups (
+            resolution TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            source_site TEXT NOT NULL,
+            category TEXT NOT NULL,
+            price_count INTEGER NOT NULL,
+            price_sum REAL NOT NULL,
+            min_price REAL,
+            max_price REAL,
+            PRIMARY KEY (resolution, bucket, source_site, category)
+        ) WITHOUT ROWID
+        ''')
+
+        # Inserts are folded in per batch by save_batches (_ROLLUP_ADD_BATCH);
+        # earlier versions did it with a per-row trigger
+        self.cursor.execute('DROP TRIGGER IF EXISTS products_rollups_ai')
+
+        if needs_backfill:
+            self._rebuild_rollups(0)
+
+    def _rebuild_rollups(self, since, extra_rows=()):
+        """Recompute the rollups from the first whole hour at or after since
+
+        Hour buckets from there on are rebuilt from the products table; the
+        hour that since falls in may also hold archived observations, so it
+        is left alone. Day buckets are regrouped from the hours, starting
+        with the day that first rebuilt hour is in. extra_rows are
+        (hour_bucket, source_site, category, price_count, price_sum,
+        min_price, max_price) tuples for observations that are no longer in
+        the products table, e.g. from the Parquet archive.
+        """
+        hour_start = math.ceil(since / 3600) * 3600
+        day_start = hour_start // 86400 * 86400
+        self.cursor.execute(
+            "DELETE FROM price_rollups WHERE resolution = 'hour' AND bucket >= ?", (hour_start,)
+        )
+        self.cursor.execute(
+            "DELETE FROM price_rollups WHERE resolution = 'day' AND bucket >= ?", (day_start,)
+        )
+
+        self.cursor.execute('''
+        INSERT INTO price_rollups
+            (resolution, bucket, source_site, category, price_count, price_sum,
+             min_price, max_price)
+        SELECT 'hour', CAST(COALESCE(timestamp, 0) / 3600 AS INTEGER) * 3600,
+               COALESCE(source_site, ''), COALESCE(category, ''),
+               COUNT(*), SUM(price), MIN(price), MAX(price)
+        FROM products
+        WHERE price IS NOT NULL AND COALESCE(timestamp, 0) >= ?
+        GROUP BY 2, 3, 4
+        ''', (hour_start,))
+
+        self.cursor.executemany('''
+        INSERT INTO price_rollups
+            (resolution, bucket, source_site, category, price_count, price_sum,
+             min_price, max_price)
+        VALUES ('hour', ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (resolution, bucket, source_site, category) DO UPDATE SET
+            price_count = price_count + excluded.price_count,
+            price_sum = price_sum + excluded.price_sum,
+            min_price = MIN(min_price, excluded.min_price),
+            max_price = MAX(max_price, excluded.max_price)
+        ''', (row for row in extra_rows if row[0] >= hour_start))
+
+        # Days are merged from the hours, so both resolutions always agree
+        self.cursor.execute('''
+        INSERT INTO price_rollups
+            (resolution, bucket, source_site, category, price_count, price_sum,
+             min_price, max_price)
+        SELECT 'day', bucket / 86400 * 86400, source_site, category,
+               SUM(price_count), SUM(price_sum), MIN(min_price), MAX(max_price)
+        FROM price_rollups
+        WHERE resolution = 'hour' AND bucket >= ?
+        GROUP BY 2, 3, 4
+        ''', (day_start,))
+
+    def rebuild_rollups(self, since=None, extra_rows=()):
+        """Recompute the price rollups from the products table
+
+        By default only buckets from the oldest live product onwards are
+        replaced, so history whose rows were archived or pruned is kept. Pass
+        since=0 together with the archived observations as extra_rows (see
+        Archiver.rollup_rows) to rebuild everything.
+        """
+        self.connect()
+        if since is None:
+            self.cursor.execute('SELECT MIN(COALESCE(timestamp, 0)) FROM products')
+            since = self.cursor.fetchone()[0]
+        if since is not None:
+            self._rebuild_rollups(since, extra_rows)
+        self.conn.commit()
+        self.disconnect()
+
+    def series_resolution(self, start=None, end=None, max_points=500, category=None):
+        """Finest resolution that covers start..end in at most max_points buckets
+
+        Open ends default to the oldest and newest rollup.
+        """
+        if start is None or end is None:
+            self.connect()
+            where, params = "WHERE resolution = 'day'", []
+            if category:
+                where += ' AND category = ?'
+                params.append(category)
+            self.cursor.execute(f'SELECT MIN(bucket), MAX(bucket) FROM price_rollups {where}',
+                                params)
+            first, last = self.cursor.fetchone()
+            self.disconnect()
+            start = first if start is None else start
+            end = last + 86400 if end is None and last is not None else end
+        if start is None or end is None:
+            return 'day'
+
+        for name, seconds in SERIES_RESOLUTIONS.items():
+            if (end - start) / seconds <= max_points:
+                return name
+        return 'month'
+
+    def price_series(self, start=None, end=None, resolution='auto', category=None,
+                     source_site=None, by_site=False, max_points=500):
+        """Average/min/max price per time bucket from the rollups
+
+        start and end are unix timestamps (end exclusive) and may be left
+        open. resolution is one of SERIES_RESOLUTIONS or 'auto', which picks
+        the finest one giving at most max_points buckets, so a year of data
+        is read as a few hundred daily or weekly rows. Returns a DataFrame
+        with 'time' (start of each bucket, UTC), 'count', 'price',
+        'min_price' and 'max_price', plus 'source_site' when by_site is set.
+        The chosen resolution is kept in df.attrs['resolution'].
+        """
+        import pandas as pd
+
+        if resolution == 'auto':
+            resolution = self.series_resolution(start, end, max_points, category)
+        if resolution not in SERIES_RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+
+        # Hourly series read the hourly rows, everything coarser the daily ones
+        source = 'hour' if resolution == 'hour' else 'day'
+        step = ROLLUP_RESOLUTIONS[source]
+        conditions = ['resolution = ?']
+        params = [source]
+        if start is not None:
+            # Include the bucket that start falls in
+            conditions.append('bucket >= ?')
+            params.append(int(start // step) * step)
+        if end is not None:
+            conditions.append('bucket < ?')
+            params.append(end)
+        if category:
+            conditions.append('category = ?')
+            params.append(category)
+        if source_site:
+            conditions.append('source_site = ?')
+            params.append(source_site)
+
+        site = 'source_site, ' if by_site else ''
+        query = f'''
+        SELECT {_SERIES_BUCKET[resolution]} AS time, {site}
+               SUM(price_count) AS count,
+               SUM(price_sum) / SUM(price_count) AS price,
+               MIN(min_price) AS min_price,
+               MAX(max_price) AS max_price
+        FROM price_rollups
+        WHERE {' AND '.join(conditions)}
+        GROUP BY time{', source_site' if by_site else ''}
+        ORDER BY time{', source_site' if by_site else ''}
+        '''
+
+        self.connect()
+        df = pd.read_sql_query(query, self.conn, params=params)
+        self.disconnect()
+
+        df['time'] = pd.to_datetime(df['time'], unit='s')
+        df.attrs['resolution'] = resolution
+        return df
     
     def save_products(self, products, source_site, category=''):
         """Save multiple products to the database"""
+        self.save_batches([(products, source_site, category)])
+
+    def match_pending(self, batch_size=200):
+        """Match up to batch_size products saved since the last call across sites
+
+        Runs in its own transaction, outside the save path (see
+        matching.MatchingWorker). Returns the number of products indexed.
+        """
+        self.connect()
+        try:
+            return self.matcher.index_pending(self.conn, batch_size)
+        finally:
+            self.disconnect()
+
+    def save_batches(self, batches):
+        """Save several (products, source_site, category) batches in one transaction"""
         self.connect()
         
+        try:
+            inserted = []
+            for products, source_site, category in batches:
+                inserted += self._insert_products(products, source_site, category)
+            if inserted:
+                # Ids are handed out in order within the transaction
+                id_range = (inserted[0], inserted[-1])
+                self.cursor.execute(_STATS_ADD_BATCH, id_range)
+                for statement in _ROLLUP_ADD_BATCH:
+                    self.cursor.execute(statement, id_range)
+            # Picks up buckets flagged by deletes outside the bulk paths
+            refresh_stale_stats(self.conn)
+            self.conn.commit()
+        finally:
+            self.disconnect()
+
+    def _insert_products(self, products, source_site, category):
+        """Insert product rows using the open connection, without committing
+
+        Returns the new row ids. The caller folds them into daily_site_stats
+        and price_rollups.
+        """
+        # Indexed attributes are pulled out of the JSON by SQLite while inserting
+        attribute_columns = ''.join(f', attr_{name}' for name in self.indexed_attributes)
+        attribute_values = ''.join(
+            f', json_extract(?9, ?{10 + i})' for i in range(len(self.indexed_attributes))
+        )
+        attribute_paths = list(self.indexed_attributes.values())
+
+        inserted = []
         for product in products:
             # Convert any additional data to JSON string
             additional_data = {}
@@ -68,142 +970,306 @@ class Database:
             additional_data_json = json.dumps(additional_data)
             
             # Insert into products table
-            self.cursor.execute('''
+            self.cursor.execute(f'''
             INSERT INTO products 
-            (title, price, rating, description, url, image_url, source_site, category, additional_data, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            (title, price, rating, url, image_url, source_site, category, timestamp{attribute_columns})
+            VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8{attribute_values})
+            ''', [
                 product.get('title', ''),
                 product.get('price'),
                 product.get('rating'),
-                product.get('description', ''),
                 product.get('url', ''),
                 product.get('image_url', ''),
                 source_site,
                 category,
-                additional_data_json,
-                product.get('timestamp', 0)
-            ))
-            
-            # Get the ID of the inserted product
+                product.get('timestamp', 0),
+            ] + ([additional_data_json] + attribute_paths if attribute_paths else []))
             product_id = self.cursor.lastrowid
-            
-            # Insert into search index
+
+            # Large, rarely read fields go to the side table; this also indexes
+            # the row for full-text search
             self.cursor.execute('''
-            INSERT INTO product_search (rowid, title, description, category)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO product_details (product_id, description, additional_data)
+            VALUES (?, ?, ?)
             ''', (
                 product_id,
-                product.get('title', ''),
-                product.get('description', ''),
-                category
+                product.get('description') or None,
+                pack_details(additional_data_json) if additional_data else None
             ))
-        
-        self.conn.commit()
+            inserted.append(product_id)
+
+        return inserted
+
+    @staticmethod
+    def _select_clause(columns):
+        """SELECT list and the product_details join for the requested product columns"""
+        columns = list(columns or DEFAULT_COLUMNS)
+        unknown = [name for name in columns if name not in PRODUCT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown product columns: {', '.join(unknown)}")
+
+        select = ', '.join(f'{PRODUCT_COLUMNS[name]} AS {name}' for name in columns)
+        join = ''
+        if any(name in DETAIL_COLUMNS for name in columns):
+            join = ' LEFT JOIN product_details d ON d.product_id = p.id'
+        return select, join
+
+    def _fetch_products(self):
+        """Turn the current cursor results into product dictionaries"""
+        columns = [desc[0] for desc in self.cursor.description]
+        products = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+        if 'additional_data' in columns:
+            for product in products:
+                product['additional_data'] = unpack_details(product['additional_data'])
+        return products
+
+    def get_product_details(self, product_id):
+        """Load the description and additional_data of a single product"""
+        self.connect()
+
+        self.cursor.execute('''
+        SELECT COALESCE(d.description, p.description),
+               COALESCE(d.additional_data, p.additional_data)
+        FROM products p
+        LEFT JOIN product_details d ON d.product_id = p.id
+        WHERE p.id = ?
+        ''', (product_id,))
+        row = self.cursor.fetchone()
+
         self.disconnect()
+        if row is None:
+            return None
+        additional_data = unpack_details(row[1])
+        return {
+            'description': row[0] or '',
+            'additional_data': json.loads(additional_data) if additional_data else {},
+        }
+
+    def compact_details(self, batch_size=1000):
+        """Move inline description/additional_data of older rows into product_details
+
+        Runs in committed batches. Returns the number of rows moved; run
+        retention.py (or VACUUM) afterwards to hand the space back.
+        """
+        self.connect()
+        moved = 0
+        try:
+            while True:
+                self.cursor.execute('''
+                SELECT id, title, description, category, additional_data FROM products
+                WHERE (description IS NOT NULL OR additional_data IS NOT NULL)
+                  AND id NOT IN (SELECT product_id FROM product_details)
+                ORDER BY id
+                LIMIT ?
+                ''', (batch_size,))
+                rows = self.cursor.fetchall()
+                if not rows:
+                    break
+
+                # Drop the old index entries; inserting the details re-indexes them
+                self.cursor.executemany('''
+                INSERT INTO product_search (product_search, rowid, title, description, category)
+                VALUES ('delete', ?, ?, ?, ?)
+                ''', [(r[0], r[1], r[2], r[3]) for r in rows])
+                self.cursor.executemany('''
+                INSERT INTO product_details (product_id, description, additional_data)
+                VALUES (?, ?, ?)
+                ''', [
+                    (r[0], r[2] or None,
+                     pack_details(r[4]) if r[4] and r[4] != '{}' else None)
+                    for r in rows
+                ])
+                self.cursor.executemany(
+                    'UPDATE products SET description = NULL, additional_data = NULL WHERE id = ?',
+                    [(r[0],) for r in rows]
+                )
+                self.conn.commit()
+                moved += len(rows)
+        finally:
+            self.disconnect()
+        return moved
     
-    def search_products(self, query, limit=20):
-        """Search for products using FTS5"""
+    @staticmethod
+    def _prefix_query(text):
+        """Turn free text into an FTS5 query matching every word as a prefix"""
+        terms = ['"{}"*'.format(word.replace('"', '""')) for word in text.split()]
+        return ' '.join(terms)
+
+    def search_products(self, query, limit=20, prefix=False, columns=None, offset=0):
+        """Search for products using FTS5, best bm25 matches first
+
+        offset skips that many of the best matches, for paging.
+        """
+        if prefix:
+            query = self._prefix_query(query)
+            if not query:
+                return []
+
+        select, join = self._select_clause(columns)
         self.connect()
         
-        self.cursor.execute('''
-        SELECT p.* FROM products p
-        JOIN product_search ps ON p.id = ps.rowid
-        WHERE product_search MATCH ?
-        ORDER BY p.rating DESC, p.price ASC
-        LIMIT ?
-        ''', (query, limit))
+        # Raw queries use FTS5 syntax, so a malformed one raises OperationalError
+        try:
+            self.cursor.execute(f'''
+            SELECT {select} FROM product_search
+            JOIN products p ON p.id = product_search.rowid{join}
+            WHERE product_search MATCH ?
+            ORDER BY bm25(product_search, ?, ?, ?)
+            LIMIT ? OFFSET ?
+            ''', (query, *SEARCH_WEIGHTS, limit, offset))
+            
+            return self._fetch_products()
+        finally:
+            self.disconnect()
+    
+    def get_products(self, category=None, limit=100, order_by='timestamp DESC', attributes=None,
+                     columns=None):
+        """Get products with optional filtering
+
+        attributes maps additional_data keys to required values, e.g.
+        {'brand': 'Apple'}. Keys listed in indexed_attributes are index lookups.
+        columns picks what to load (default: everything but description and
+        additional_data, which are only read from product_details on request).
+        """
+        select, join = self._select_clause(columns)
+        self.connect()
         
-        results = self.cursor.fetchall()
+        query = f'SELECT {select} FROM products p{join}'
+        conditions, params = self._attribute_filters(attributes)
         
-        # Convert to list of dictionaries
-        columns = [desc[0] for desc in self.cursor.description]
-        products = [dict(zip(columns, row)) for row in results]
+        if category:
+            conditions.insert(0, 'p.category = ?')
+            params.insert(0, category)
+        
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        
+        query += f' ORDER BY {order_by} LIMIT ?'
+        params.append(limit)
+        
+        self.cursor.execute(query, params)
+        products = self._fetch_products()
         
         self.disconnect()
         return products
     
-    def get_products(self, category=None, limit=100, order_by='timestamp DESC'):
-        """Get products with optional filtering"""
-        self.connect()
-        
-        query = 'SELECT * FROM products'
-        params = []
+    def page_products(self, category=None, limit=100, before_id=None, columns=None,
+                      attributes=None):
+        """One page of products, newest id first, for keyset pagination
+
+        Pass the last id of a page as before_id to get the next one. Unlike an
+        OFFSET, every page costs the same however deep it is. 'id' is always
+        included in the rows.
+        """
+        columns = list(columns or DEFAULT_COLUMNS)
+        if 'id' not in columns:
+            columns.insert(0, 'id')
+        select, join = self._select_clause(columns)
         
+        conditions, params = self._attribute_filters(attributes)
         if category:
-            query += ' WHERE category = ?'
-            params.append(category)
+            conditions.insert(0, 'p.category = ?')
+            params.insert(0, category)
+        if before_id is not None:
+            conditions.append('p.id < ?')
+            params.append(before_id)
         
-        query += f' ORDER BY {order_by} LIMIT ?'
+        query = f'SELECT {select} FROM products p{join}'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY p.id DESC LIMIT ?'
         params.append(limit)
         
+        self.connect()
         self.cursor.execute(query, params)
-        results = self.cursor.fetchall()
-        
-        # Convert to list of dictionaries
-        columns = [desc[0] for desc in self.cursor.description]
-        products = [dict(zip(columns, row)) for row in results]
+        products = self._fetch_products()
         
         self.disconnect()
         return products
     
-    def export_to_excel(self, filename=None, category=None):
-        """Export product data to Excel"""
-        import os
-        from datetime import datetime
-
-        # Create exports directory if it doesn't exist
-        os.makedirs('exports', exist_ok=True)
-
-        # Generate filename if not provided
-        if filename is None:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            category_suffix = f"_{category}" if category else ""
-            filename = f'exports/product_data{category_suffix}_{timestamp}.xlsx'
-        elif not filename.startswith('exports/'):
-            filename = f'exports/{filename}'
+    def get_matched_prices(self, category=None, min_sites=2, limit=50):
+        """Average price per site for products matched across at least min_sites sites"""
+        import pandas as pd
 
         self.connect()
 
-        query = 'SELECT * FROM products'
-        params = []
+        category_filter = ' AND p.category = ?' if category else ''
+        params = ([category] if category else []) + [min_sites, limit]
 
-        if category:
-            query += ' WHERE category = ?'
-            params.append(category)
+        query = f'''
+        WITH cross_site AS (
+            SELECT g.group_id
+            FROM product_groups g JOIN products p ON p.id = g.product_id
+            WHERE 1 = 1{category_filter}
+            GROUP BY g.group_id
+            HAVING COUNT(DISTINCT p.source_site) >= ?
+            ORDER BY g.group_id DESC
+            LIMIT ?
+        )
+        SELECT
+            g.group_id,
+            MIN(p.title) as title,
+            p.source_site,
+            AVG(p.price) as avg_price,
+            COUNT(*) as observations
+        FROM cross_site c
+        JOIN product_groups g ON g.group_id = c.group_id
+        JOIN products p ON p.id = g.product_id
+        WHERE p.price IS NOT NULL
+        GROUP BY g.group_id, p.source_site
+        ORDER BY g.group_id, avg_price
+        '''
 
         df = pd.read_sql_query(query, self.conn, params=params)
 
-        if df.empty:
-            self.disconnect()
-            raise ValueError("No data to export")
+        self.disconnect()
+        return df
 
-        # Convert timestamp to datetime
-        df['date'] = pd.to_datetime(df['timestamp'], unit='s')
+    def export_products(self, fmt='xlsx', filename=None, category=None, chunk_size=5000):
+        """Stream product data to a CSV, NDJSON, Parquet or Excel file"""
+        from exporter import Exporter
+        return Exporter(self.db_path, chunk_size=chunk_size).export(fmt, filename, category)
 
-        # Reorder columns for better readability
-        column_order = ['title', 'price', 'rating', 'description', 'source_site',
-                       'category', 'url', 'image_url', 'date', 'created_at']
-        df = df[[col for col in column_order if col in df.columns]]
+    def export_to_excel(self, filename=None, category=None):
+        """Export product data to Excel"""
+        return self.export_products('xlsx', filename=filename, category=category)
+    
+    def data_fingerprint(self, category=None):
+        """Cheap token that changes whenever products are added or removed
 
-        # Save to Excel
-        df.to_excel(filename, index=False, engine='openpyxl')
+        Combines the row count (from the aggregate stats) with the newest id
+        and timestamp, all index lookups, so caches can key on it per request.
+        """
+        self.connect()
+
+        category_filter = ' WHERE category = ?' if category else ''
+        self.cursor.execute(f'''
+        SELECT
+            (SELECT COALESCE(SUM(product_count), 0) FROM daily_site_stats{category_filter}),
+            (SELECT MAX(id) FROM products),
+            (SELECT MAX(timestamp) FROM products)
+        ''', [category] if category else [])
+        row = self.cursor.fetchone()
 
         self.disconnect()
-        return filename
+        return ':'.join(str(value) for value in row)
     
     def get_price_stats(self, category=None):
         """Get price statistics for visualization"""
+        import pandas as pd
+
         self.connect()
         
+        # Read from the incrementally maintained daily aggregates, so the cost
+        # depends on the number of sites and days rather than on the row count
         query = '''
         SELECT 
             source_site,
-            COUNT(*) as count,
-            AVG(price) as avg_price,
-            MIN(price) as min_price,
-            MAX(price) as max_price
-        FROM products
+            SUM(product_count) as count,
+            SUM(price_sum) / NULLIF(SUM(price_count), 0) as avg_price,
+            MIN(min_price) as min_price,
+            MAX(max_price) as max_price
+        FROM daily_site_stats
         '''
         
         params = []
@@ -220,15 +1286,17 @@ class Database:
     
     def get_rating_stats(self, category=None):
         """Get rating statistics for visualization"""
+        import pandas as pd
+
         self.connect()
         
         query = '''
         SELECT 
             source_site,
-            COUNT(*) as count,
-            AVG(rating) as avg_rating
-        FROM products
-        WHERE rating IS NOT NULL
+            SUM(rating_count) as count,
+            SUM(rating_sum) / SUM(rating_count) as avg_rating
+        FROM daily_site_stats
+        WHERE rating_count > 0
         '''
         
         params = []
@@ -241,4 +1309,192 @@ class Database:
         df = pd.read_sql_query(query, self.conn, params=params)
         
         self.disconnect()
-        return df
\ No newline at end of file
+        return df
+
+    @staticmethod
+    def _bin_width(low, high, bins):
+        # A single distinct value still gets one non-zero-width bin
+        return (high - low) / bins if high > low else 1.0
+
+    def price_histogram(self, category=None, bins=20):
+        """Price histogram of every matching product, binned in SQL
+
+        Returns one row per bin (bin_start, bin_end, count, price_sum), empty
+        bins included, so the chart never loads individual products.
+        """
+        import pandas as pd
+
+        columns = ['bin_start', 'bin_end', 'count', 'price_sum']
+        self.connect()
+
+        where = 'WHERE price IS NOT NULL'
+        params = []
+        if category:
+            where += ' AND category = ?'
+            params.append(category)
+
+        self.cursor.execute(f'SELECT MIN(price), MAX(price) FROM products {where}', params)
+        low, high = self.cursor.fetchone()
+        if low is None:
+            self.disconnect()
+            return pd.DataFrame(columns=columns)
+
+        width = self._bin_width(low, high, bins)
+        self.cursor.execute(f'''
+        SELECT MIN(CAST((price - ?) / ? AS INTEGER), ?) AS bin, COUNT(*), SUM(price)
+        FROM products {where}
+        GROUP BY bin
+        ''', [low, width, bins - 1] + params)
+        counts = {row[0]: row[1:] for row in self.cursor.fetchall()}
+
+        self.disconnect()
+        return pd.DataFrame([
+            (low + i * width, low + (i + 1) * width) + counts.get(i, (0, 0.0))
+            for i in range(bins)
+        ], columns=columns)
+
+    def price_rating_summary(self, category=None, sample_size=500, price_bins=20,
+                             rating_step=0.5, seed=0):
+        """Everything the price vs rating chart needs, computed in SQL
+
+        Returns a dict with:
+          count      products that have both a price and a rating
+          rating_step  width of the rating buckets below
+          fit        least-squares slope/intercept of price on rating (or None)
+          quantiles  p25/median/p75 price per rating bucket of width rating_step
+          density    product count per (rating bucket, price bin) cell
+          sample     at most sample_size (rating, price) points, drawn uniformly
+                     in SQL so only the sample leaves SQLite
+
+        The sample is seeded so the same data always gives the same points.
+        """
+        import pandas as pd
+
+        self.connect()
+
+        where = 'WHERE price IS NOT NULL AND rating IS NOT NULL'
+        params = []
+        if category:
+            where += ' AND category = ?'
+            params.append(category)
+
+        # Regression from running sums, so no point ever leaves SQLite
+        self.cursor.execute(f'''
+        SELECT COUNT(*), SUM(rating), SUM(price), SUM(rating * price), SUM(rating * rating),
+               MIN(price), MAX(price), MAX(rating)
+        FROM products {where}
+        ''', params)
+        n, sum_x, sum_y, sum_xy, sum_xx, low, high, max_rating = self.cursor.fetchone()
+
+        summary = {
+            'count': n,
+            'rating_step': rating_step,
+            'fit': None,
+            'quantiles': pd.DataFrame(columns=['rating', 'count', 'p25', 'median', 'p75']),
+            'density': pd.DataFrame(columns=['rating', 'bin_start', 'bin_end', 'count']),
+            'sample': pd.DataFrame(columns=['rating', 'price']),
+        }
+        if not n:
+            self.disconnect()
+            return summary
+
+        denominator = n * sum_xx - sum_x * sum_x
+        if denominator:
+            slope = (n * sum_xy - sum_x * sum_y) / denominator
+            summary['fit'] = {'slope': slope, 'intercept': (sum_y - slope * sum_x) / n}
+
+        # The top rating (e.g. 5.0) belongs to the last bucket, not one of its own
+        last_bucket = max(math.ceil(max_rating / rating_step) - 1, 0)
+        bucket = f'MIN(CAST(rating / {float(rating_step)} AS INTEGER), {last_bucket})'
+
+        # Nearest-rank quantiles from window functions over each rating bucket
+        self.cursor.execute(f'''
+        SELECT bucket, n, rn, price FROM (
+            SELECT {bucket} AS bucket, price,
+                   ROW_NUMBER() OVER (PARTITION BY {bucket} ORDER BY price) AS rn,
+                   COUNT(*) OVER (PARTITION BY {bucket}) AS n
+            FROM products {where}
+        )
+        WHERE rn IN (CAST(0.25 * (n - 1) AS INTEGER) + 1,
+                     CAST(0.5 * (n - 1) AS INTEGER) + 1,
+                     CAST(0.75 * (n - 1) AS INTEGER) + 1)
+        ORDER BY bucket, rn
+        ''', params)
+        quantiles = {}
+        for index, count, rank, price in self.cursor.fetchall():
+            row = quantiles.setdefault(index, {'rating': (index + 0.5) * rating_step,
+                                               'count': count})
+            for name, q in (('p25', 0.25), ('median', 0.5), ('p75', 0.75)):
+                if rank == int(q * (count - 1)) + 1:
+                    row[name] = price
+        summary['quantiles'] = pd.DataFrame(list(quantiles.values()),
+                                            columns=['rating', 'count', 'p25', 'median', 'p75'])
+
+        width = self._bin_width(low, high, price_bins)
+        self.cursor.execute(f'''
+        SELECT {bucket} AS bucket, MIN(CAST((price - ?) / ? AS INTEGER), ?) AS bin, COUNT(*)
+        FROM products {where}
+        GROUP BY bucket, bin
+        ''', [low, width, price_bins - 1] + params)
+        summary['density'] = pd.DataFrame([
+            ((index + 0.5) * rating_step, low + i * width, low + (i + 1) * width, count)
+            for index, i, count in self.cursor.fetchall()
+        ], columns=['rating', 'bin_start', 'bin_end', 'count'])
+
+        # Uniform sample picked in SQL: rows ordered by a multiplicative hash of
+        # their id, offset by the seed, of which SQLite's sorter only keeps the
+        # first sample_size
+        self.cursor.execute(f'''
+        SELECT rating, price FROM products {where}
+        ORDER BY (id * 2654435761 + ? * 2246822519) % 4294967296
+        LIMIT ?
+        ''', params + [seed, sample_size])
+        sample = self.cursor.fetchall()
+        summary['sample'] = pd.DataFrame(sample, columns=['rating', 'price'])
+
+        self.disconnect()
+        return summary
+
+
+def main():
+    """Command line maintenance tasks for the scrape database"""
+    parser = argparse.ArgumentParser(description='E-commerce scraper database maintenance')
+    parser.add_argument('--db', default='ecommerce_data.db', help='Path to the SQLite database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('rebuild-stats', help='Recompute the aggregate stats tables')
+    subparsers.add_parser('rebuild-search', help='Rebuild the full-text search index')
+    subparsers.add_parser(
+        'rebuild-rollups', help='Recompute the price rollups covered by live products'
+    )
+    subparsers.add_parser(
+        'compact-details', help='Move inline descriptions and extra data into product_details'
+    )
+    optimize_parser = subparsers.add_parser(
+        'optimize-search', help='Incrementally merge the full-text search index'
+    )
+    optimize_parser.add_argument('--pages-per-step', type=int, default=500,
+                                 help='Pages merged per committed step')
+
+    args = parser.parse_args()
+    database = Database(args.db)
+
+    if args.command == 'rebuild-stats':
+        database.rebuild_stats()
+        print("✅ Aggregate stats rebuilt")
+    elif args.command == 'rebuild-rollups':
+        database.rebuild_rollups()
+        print("✅ Price rollups rebuilt")
+    elif args.command == 'compact-details':
+        moved = database.compact_details()
+        print(f"✅ Moved details of {moved} products into product_details")
+    elif args.command == 'rebuild-search':
+        database.rebuild_search_index()
+        print("✅ Search index rebuilt")
+    elif args.command == 'optimize-search':
+        steps = database.optimize_search_index(args.pages_per_step)
+        print(f"✅ Search index optimized in {steps} step(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import os
+import csv
+import json
+import sqlite3
+from datetime import datetime
+
+# Parquet support is optional
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    pa = None
+    pq = None
+    PARQUET_AVAILABLE = False
+
+# Columns written to every export, in order
+EXPORT_COLUMNS = ['title', 'price', 'rating', 'description', 'source_site',
+                  'category', 'url', 'image_url', 'date', 'created_at']
+
+EXPORT_FORMATS = {
+    'csv': 'csv',
+    'ndjson': 'ndjson',
+    'parquet': 'parquet',
+    'xlsx': 'xlsx',
+}
+
+# Excel sheets hold 1,048,576 rows including the header
+XLSX_MAX_ROWS = 1048575
+
+class Exporter:
+    """Stream product rows from the database to a file in fixed-size chunks
+
+    Rows are read with fetchmany() and written as they arrive, so memory use
+    depends on chunk_size rather than on the number of exported rows.
+    """
+
+    def __init__(self, db_path, chunk_size=5000):
+        self.db_path = db_path
+        self.chunk_size = chunk_size
+
+    def _iter_chunks(self, category=None):
+        """Yield lists of row tuples in EXPORT_COLUMNS order"""
+        query = '''
+        SELECT p.title, p.price, p.rating, COALESCE(d.description, p.description),
+               p.source_site, p.category, p.url, p.image_url,
+               datetime(p.timestamp, 'unixepoch') AS date, p.created_at
+        FROM products p
+        LEFT JOIN product_details d ON d.product_id = p.id
+        '''
+        params = []
+
+        if category:
+            query += ' WHERE p.category = ?'
+            params.append(category)
+
+        query += ' ORDER BY p.id'
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    def default_filename(self, fmt, category=None):
+        """Build a timestamped filename inside the exports directory"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        category_suffix = f"_{category}" if category else ""
+        return f'exports/product_data{category_suffix}_{timestamp}.{EXPORT_FORMATS[fmt]}'
+
+    def export(self, fmt='xlsx', filename=None, category=None):
+        """Export products to filename in the given format and return the path"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        if fmt == 'parquet' and not PARQUET_AVAILABLE:
+            raise ValueError("Parquet export requires pyarrow to be installed")
+
+        # Create exports directory if it doesn't exist
+        os.makedirs('exports', exist_ok=True)
+
+        if filename is None:
+            filename = self.default_filename(fmt, category)
+        elif not filename.startswith('exports/'):
+            filename = f'exports/{filename}'
+
+        writer = getattr(self, f'_write_{fmt}')
+        try:
+            row_count = writer(filename, self._iter_chunks(category))
+        except Exception:
+            if os.path.exists(filename):
+                os.remove(filename)
+            raise
+
+        if row_count == 0:
+            os.remove(filename)
+            raise ValueError("No data to export")
+
+        return filename
+
+    @staticmethod
+    def _parse_date(value):
+        """Convert SQLite datetime text into a datetime object"""
+        return datetime.fromisoformat(value) if value else None
+
+    def _write_csv(self, filename, chunks):
+        row_count = 0
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_COLUMNS)
+            for rows in chunks:
+                writer.writerows(rows)
+                row_count += len(rows)
+        return row_count
+
+    def _write_ndjson(self, filename, chunks):
+        row_count = 0
+        with open(filename, 'w', encoding='utf-8') as f:
+            for rows in chunks:
+                f.writelines(
+                    json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n'
+                    for row in rows
+                )
+                row_count += len(rows)
+        return row_count
+
+    def _write_parquet(self, filename, chunks):
+        schema = pa.schema([
+            ('title', pa.string()),
+            ('price', pa.float64()),
+            ('rating', pa.float64()),
+            ('description', pa.string()),
+            ('source_site', pa.string()),
+            ('category', pa.string()),
+            ('url', pa.string()),
+            ('image_url', pa.string()),
+            ('date', pa.timestamp('s')),
+            ('created_at', pa.string()),
+        ])
+        date_index = EXPORT_COLUMNS.index('date')
+
+        row_count = 0
+        with pq.ParquetWriter(filename, schema) as writer:
+            for rows in chunks:
+                columns = [list(column) for column in zip(*rows)]
+                columns[date_index] = [self._parse_date(v) for v in columns[date_index]]
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                row_count += len(rows)
+        return row_count
+
+    def _write_xlsx(self, filename, chunks):
+        from openpyxl import Workbook
+
+        # Write-only workbooks stream rows to disk instead of keeping cells in memory
+        workbook = Workbook(write_only=True)
+        sheet = None
+        sheet_rows = XLSX_MAX_ROWS
+        date_index = EXPORT_COLUMNS.index('date')
+
+        row_count = 0
+        for rows in chunks:
+            for row in rows:
+                if sheet_rows >= XLSX_MAX_ROWS:
+                    sheet_number = len(workbook.worksheets) + 1
+                    sheet_name = f'Products {sheet_number}' if sheet_number > 1 else 'Products'
+                    sheet = workbook.create_sheet(sheet_name)
+                    sheet.append(EXPORT_COLUMNS)
+                    sheet_rows = 0
+                row = list(row)
+                row[date_index] = self._parse_date(row[date_index])
+                sheet.append(row)
+                sheet_rows += 1
+            row_count += len(rows)
+
+        if sheet is None:
+            # openpyxl refuses to save a workbook without sheets
+            workbook.create_sheet('Products').append(EXPORT_COLUMNS)
+
+        workbook.save(filename)
+        return row_count
@@ -0,0 +1,228 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# Product fields sent with 'page' events, enough to list the results as they arrive
+EVENT_PRODUCT_FIELDS = ('title', 'price', 'rating', 'url', 'image_url')
+
+class ScrapeJob:
+    """Progress of one background crawl
+
+    Besides the counters, a job keeps an ordered log of events ('started',
+    'page', 'saved', 'error', 'done') that stream readers can wait on with
+    wait_events().
+    """
+
+    def __init__(self, url, category='', max_pages=1):
+        self.id = uuid.uuid4().hex[:12]
+        self.url = url
+        self.source_site = urlparse(url).netloc
+        self.category = category
+        self.max_pages = max_pages
+        self.status = 'queued'
+        self.pages_done = 0
+        self.products_found = 0
+        self.products_saved = 0
+        self.errors = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = []
+        # Where the latest snapshot is written for other processes (see JobManager)
+        self.state_path = None
+        self._changed = threading.Condition()
+
+    def emit(self, event, **data):
+        """Append an event (with a snapshot of the job) and wake up waiting readers"""
+        with self._changed:
+            data['job'] = self.to_dict()
+            self.events.append({'id': len(self.events) + 1, 'event': event, 'data': data})
+            if self.state_path:
+                with open(f'{self.state_path}.tmp', 'w') as f:
+                    json.dump(data['job'], f)
+                os.replace(f'{self.state_path}.tmp', self.state_path)
+            self._changed.notify_all()
+
+    def wait_events(self, after=0, timeout=None):
+        """Events with an id above after, waiting up to timeout for the next one"""
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.events) > after, timeout)
+            return self.events[after:]
+
+    @property
+    def done(self):
+        return self.status in ('finished', 'failed')
+
+    def eta(self):
+        """Seconds until the last page is done, from the average page time so far"""
+        if self.done:
+            return 0.0
+        if not self.started_at or not self.pages_done:
+            return None
+        per_page = (time.time() - self.started_at) / self.pages_done
+        return round(per_page * (self.max_pages - self.pages_done), 1)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'source_site': self.source_site,
+            'category': self.category,
+            'status': self.status,
+            'pages_done': self.pages_done,
+            'max_pages': self.max_pages,
+            'products_found': self.products_found,
+            'products_saved': self.products_saved,
+            'errors': list(self.errors),
+            'eta': self.eta(),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobManager:
+    """Run scrapes on a bounded pool of background threads
+
+    submit() returns at once with a ScrapeJob that is updated page by page, so
+    web requests never wait for a crawl and the number of concurrent crawls
+    (and the polite delays between their pages) no longer depends on how many
+    request threads the server has. Each page is handed to the shared
+    DatabaseWriter as soon as it is parsed.
+
+    Jobs are kept in memory; the oldest finished ones are forgotten once more
+    than max_jobs are tracked. With state_dir, every job also writes its
+    latest snapshot there, so that when several server processes share the
+    directory status() answers for jobs started by any of them.
+    """
+
+    def __init__(self, scraper_factory, writer, max_workers=4, max_queued=20, max_jobs=200,
+                 state_dir=None):
+        self.scraper_factory = scraper_factory
+        self.writer = writer
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_jobs = max_jobs
+        self.state_dir = state_dir
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape')
+
+    def submit(self, url, category='', max_pages=1):
+        """Queue a crawl and return its ScrapeJob
+
+        Raises RuntimeError when max_queued jobs are already waiting.
+        """
+        job = ScrapeJob(url, category, max_pages)
+        if self.state_dir:
+            job.state_path = os.path.join(self.state_dir, f'{job.id}.json')
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j.status == 'queued')
+            if queued >= self.max_queued:
+                raise RuntimeError("Too many scrape jobs are waiting, try again later")
+            self._jobs[job.id] = job
+            self._forget_finished()
+        self._pool.submit(self._run, job)
+        return job
+
+    def _forget_finished(self):
+        for job_id in [j.id for j in self._jobs.values() if j.done]:
+            if len(self._jobs) <= self.max_jobs:
+                break
+            job = self._jobs.pop(job_id)
+            if job.state_path and os.path.exists(job.state_path):
+                os.remove(job.state_path)
+
+    def get(self, job_id):
+        """The job with job_id, or None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        """All tracked jobs, newest first"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def status(self, job_id):
+        """Snapshot dict of a job of this process, or from state_dir; None if unknown"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if not self.state_dir or not re.fullmatch(r'[0-9a-f]+', job_id):
+            return None
+        try:
+            with open(os.path.join(self.state_dir, f'{job_id}.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def statuses(self):
+        """Snapshots of every job in state_dir (or of this process), newest first"""
+        local = {job.id: job.to_dict() for job in self.jobs()}
+        if self.state_dir:
+            for name in os.listdir(self.state_dir):
+                job_id, ext = os.path.splitext(name)
+                if ext == '.json' and job_id not in local:
+                    snapshot = self.status(job_id)
+                    if snapshot is not None:
+                        local[job_id] = snapshot
+        return sorted(local.values(), key=lambda job: job['created_at'], reverse=True)
+
+    @staticmethod
+    def _saved(job, page, future):
+        # Live progress only; _run sets the final count once every batch is in
+        if future.exception() is None:
+            with job._changed:
+                if job.done:
+                    return
+                job.products_saved += future.result()
+                job.emit('saved', page=page, count=future.result())
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        job.emit('started')
+        # Scrapers keep a requests session, so every job gets its own
+        scraper = self.scraper_factory()
+        pending = []
+        try:
+            for page, products in scraper.iter_product_pages(job.url, job.max_pages):
+                if products:
+                    future = self.writer.submit(products, job.source_site, job.category)
+                    future.add_done_callback(lambda f, page=page: self._saved(job, page, f))
+                    pending.append(future)
+                job.products_found += len(products)
+                job.pages_done = page
+                job.emit('page', page=page, count=len(products), products=[
+                    {name: product.get(name) for name in EVENT_PRODUCT_FIELDS}
+                    for product in products
+                ])
+        except Exception as e:
+            job.errors.append(f"Page {job.pages_done + 1}: {e}")
+            job.emit('error', message=job.errors[-1])
+
+        saved = 0
+        for future in pending:
+            try:
+                saved += future.result()
+            except Exception as e:
+                job.errors.append(f"Saving failed: {e}")
+                job.emit('error', message=job.errors[-1])
+        with job._changed:
+            job.products_saved = saved
+            # Pages that were scraped before an error are still kept
+            job.status = 'failed' if job.errors and not saved else 'finished'
+            job.finished_at = time.time()
+            job.emit('done')
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and, with wait, let running ones finish"""
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,330 @@
+import re
+import zlib
+import hashlib
+import argparse
+import threading
+
+# 64 MinHash values split into 16 bands of 4 rows. Two titles with Jaccard
+# similarity s share at least one band with probability 1 - (1 - s^4)^16,
+# which is ~50% at s = 0.5 and ~96% at s = 0.7.
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+
+# Estimated Jaccard similarity needed to record a match
+MATCH_THRESHOLD = 0.6
+
+# Upper bound on candidates checked per product, so a product observed many
+# times does not make every later insert slower
+MAX_CANDIDATES = 200
+
+# Prime just above 2^32 for the (a * x + b) mod p permutations
+_PRIME = 4294967311
+
+def shingles(title, k=3):
+    """Character k-grams of a normalised title"""
+    text = ' '.join(re.findall(r'[a-z0-9]+', (title or '').lower()))
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+class ProductMatcher:
+    """Find rows that describe the same product using MinHash signatures and LSH
+
+    Each product's title is reduced to a MinHash signature, stored in
+    product_signatures, and hashed band by band into lsh_buckets. Rows that
+    share a bucket are candidates; candidates whose estimated similarity
+    clears MATCH_THRESHOLD are written to product_matches (best match per
+    other source_site), and the row joins a product_groups group. Only
+    candidates are compared, so indexing a new product costs the same however
+    large the catalog gets. Rows are indexed after they are saved, by
+    index_pending() (see MatchingWorker), not inside the insert transaction.
+    """
+
+    def __init__(self, threshold=MATCH_THRESHOLD, seed=1):
+        # numpy is imported on first use so importing this module stays cheap
+        import numpy as np
+
+        self.threshold = threshold
+        self._prime = np.uint64(_PRIME)
+        rng = np.random.RandomState(seed)
+        # a < 2^31 and x < 2^32 keep a * x + b inside uint64
+        self._a = rng.randint(1, 2 ** 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+        self._b = rng.randint(0, 2 ** 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+    @staticmethod
+    def create_tables(cursor):
+        """Create the matching tables and the triggers that clean them up"""
+        cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS product_signatures (
+            product_id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS lsh_buckets (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            PRIMARY KEY (band, bucket, product_id)
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_lsh_buckets_product ON lsh_buckets (product_id);
+
+        CREATE TABLE IF NOT EXISTS product_matches (
+            product_id INTEGER NOT NULL,
+            match_id INTEGER NOT NULL,
+            similarity REAL NOT NULL,
+            PRIMARY KEY (product_id, match_id)
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_product_matches_match ON product_matches (match_id);
+
+        CREATE TABLE IF NOT EXISTS product_groups (
+            product_id INTEGER PRIMARY KEY,
+            group_id INTEGER NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_product_groups_group ON product_groups (group_id);
+
+        CREATE TRIGGER IF NOT EXISTS products_matching_ad AFTER DELETE ON products
+        BEGIN
+            DELETE FROM product_signatures WHERE product_id = OLD.id;
+            DELETE FROM lsh_buckets WHERE product_id = OLD.id;
+            DELETE FROM product_matches WHERE product_id = OLD.id OR match_id = OLD.id;
+            DELETE FROM product_groups WHERE product_id = OLD.id;
+        END;
+        ''')
+
+    def signature(self, title):
+        """MinHash signature of a title as a uint32 array"""
+        import numpy as np
+
+        values = np.fromiter(
+            (zlib.crc32(s.encode('utf-8')) for s in shingles(title)), dtype=np.uint64
+        )
+        if values.size == 0:
+            return np.zeros(NUM_PERM, dtype=np.uint32)
+        hashed = (np.outer(self._a, values) + self._b[:, None]) % self._prime
+        return hashed.min(axis=1).astype(np.uint32)
+
+    @staticmethod
+    def band_buckets(signature):
+        """One 63-bit bucket hash per band"""
+        buckets = []
+        for band in range(BANDS):
+            chunk = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()
+            digest = hashlib.blake2b(chunk, digest_size=8).digest()
+            buckets.append((band, int.from_bytes(digest, 'big') >> 1))
+        return buckets
+
+    def index_products(self, cursor, products):
+        """Match and index (product_id, title, source_site, product_key) rows
+
+        Runs inside the caller's transaction so matches commit with the index.
+        """
+        import numpy as np
+
+        for product_id, title, source_site, product_key in products:
+            signature = self.signature(title)
+            buckets = self.band_buckets(signature)
+
+            placeholders = ', '.join(['(?, ?)'] * len(buckets))
+            cursor.execute(f'''
+            WITH query (band, bucket) AS (VALUES {placeholders})
+            SELECT s.product_id, s.signature, COALESCE(p.source_site, '')
+            FROM (
+                SELECT DISTINCT b.product_id FROM query
+                JOIN lsh_buckets b ON b.band = query.band AND b.bucket = query.bucket
+                ORDER BY b.product_id DESC
+                LIMIT ?
+            ) c
+            JOIN product_signatures s ON s.product_id = c.product_id
+            JOIN products p ON p.id = c.product_id
+            ''', [value for pair in buckets for value in pair] + [MAX_CANDIDATES])
+
+            candidates = cursor.fetchall()
+            best = {}
+            if candidates:
+                signatures = np.frombuffer(b''.join(c[1] for c in candidates), dtype=np.uint32)
+                similarities = (signatures.reshape(-1, NUM_PERM) == signature).mean(axis=1)
+
+                # Keep the best candidate per other site; ties go to the newest row
+                for (candidate_id, _, candidate_site), similarity in zip(candidates, similarities):
+                    if candidate_site == source_site or similarity < self.threshold:
+                        continue
+                    current = best.get(candidate_site)
+                    if current is None or similarity > current[1]:
+                        best[candidate_site] = (candidate_id, float(similarity))
+
+            cursor.execute(
+                'INSERT OR REPLACE INTO product_signatures (product_id, signature) VALUES (?, ?)',
+                (product_id, signature.tobytes())
+            )
+            cursor.executemany(
+                'INSERT OR IGNORE INTO lsh_buckets (band, bucket, product_id) VALUES (?, ?, ?)',
+                [(band, bucket, product_id) for band, bucket in buckets]
+            )
+            cursor.executemany(
+                'INSERT OR REPLACE INTO product_matches (product_id, match_id, similarity) '
+                'VALUES (?, ?, ?)',
+                [(product_id, match_id, similarity) for match_id, similarity in best.values()]
+            )
+            group_id = self._choose_group(cursor, product_id, signature, source_site,
+                                          product_key, sorted(best.values(), key=lambda m: -m[1]))
+            cursor.execute(
+                'INSERT OR REPLACE INTO product_groups (product_id, group_id) VALUES (?, ?)',
+                (product_id, group_id)
+            )
+
+    def _choose_group(self, cursor, product_id, signature, source_site, product_key, matches):
+        """Group of a new row: its earlier observations' group, or the group of its
+        best match that it fits into, or a new group of its own
+
+        Groups are never merged, so matches cannot chain unrelated products
+        together. A group is joined only when the new row is similar enough to
+        the row that founded it and the group holds no other product of the
+        same site.
+        """
+        import numpy as np
+
+        # The same product seen again on the same site stays in its group
+        cursor.execute('''
+        SELECT g.group_id FROM products p JOIN product_groups g ON g.product_id = p.id
+        WHERE p.product_key = ? AND p.id < ?
+        ORDER BY p.id DESC LIMIT 1
+        ''', (product_key, product_id))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+
+        for match_id, _ in matches:
+            cursor.execute('SELECT group_id FROM product_groups WHERE product_id = ?', (match_id,))
+            row = cursor.fetchone()
+            group_id = row[0] if row else match_id
+
+            # group_id is the id of the row that founded the group; once that row
+            # is gone, the match itself already cleared the threshold
+            cursor.execute('SELECT signature FROM product_signatures WHERE product_id = ?',
+                           (group_id,))
+            founder = cursor.fetchone()
+            if founder is not None:
+                similarity = (np.frombuffer(founder[0], dtype=np.uint32) == signature).mean()
+                if similarity < self.threshold:
+                    continue
+
+            cursor.execute('''
+            SELECT 1 FROM product_groups g JOIN products p ON p.id = g.product_id
+            WHERE g.group_id = ? AND p.source_site = ? AND p.product_key != ?
+            LIMIT 1
+            ''', (group_id, source_site, product_key))
+            if cursor.fetchone() is None:
+                return group_id
+        return product_id
+
+    def index_pending(self, conn, batch_size=200):
+        """Index up to batch_size rows saved since the last call, in one transaction
+
+        Returns the number of rows indexed. BEGIN IMMEDIATE takes the write lock
+        before the pending rows are read, so several processes can call this
+        without indexing the same rows twice.
+        """
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute(
+                "SELECT id, title, COALESCE(source_site, ''), product_key FROM products "
+                'WHERE id > (SELECT COALESCE(MAX(product_id), 0) FROM product_signatures) '
+                'ORDER BY id LIMIT ?',
+                (batch_size,)
+            )
+            rows = cursor.fetchall()
+            self.index_products(cursor, rows)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return len(rows)
+
+    def rebuild(self, conn, batch_size=1000):
+        """Re-index every product from scratch, committing every batch_size rows"""
+        cursor = conn.cursor()
+        for table in ('product_signatures', 'lsh_buckets', 'product_matches', 'product_groups'):
+            cursor.execute(f'DELETE FROM {table}')
+        conn.commit()
+
+        indexed = 0
+        while True:
+            count = self.index_pending(conn, batch_size)
+            if not count:
+                break
+            indexed += count
+        return indexed
+
+class MatchingWorker:
+    """Background thread that keeps the matching index up to date
+
+    Products are saved without matching. Every interval seconds this thread
+    indexes the rows saved since its last run, batch_size rows per
+    transaction, so the MinHash work never holds up the writer thread.
+    """
+
+    def __init__(self, database, interval=5.0, batch_size=200):
+        self.database = database
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the matching thread if it is not already running"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='product-matching',
+                                            daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=None):
+        """Stop the matching thread after the batch in progress"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                # Full batches mean more rows are waiting
+                while (not self._stop.is_set()
+                       and self.database.match_pending(self.batch_size) == self.batch_size):
+                    pass
+            except Exception as e:
+                print(f"⚠️  Product matching failed: {e}")
+
+
+def main():
+    """Index or rebuild the product matching index from the command line"""
+    parser = argparse.ArgumentParser(description='Match products across sites')
+    parser.add_argument('--db', default='ecommerce_data.db', help='Path to the SQLite database')
+    parser.add_argument('--pending', action='store_true',
+                        help='Only index rows saved since the last run instead of rebuilding')
+    args = parser.parse_args()
+
+    from database import Database
+    database = Database(args.db)  # makes sure the matching tables exist
+
+    if args.pending:
+        indexed = 0
+        while True:
+            count = database.match_pending(1000)
+            if not count:
+                break
+            indexed += count
+    else:
+        database.connect()
+        try:
+            indexed = database.matcher.rebuild(database.conn)
+        finally:
+            database.disconnect()
+    print(f"✅ Indexed {indexed} products for matching")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import time
+import struct
+import threading
+from visualizer import RenderCache
+
+# Each stored value starts with its expiry time (unix seconds, 8-byte double)
+_EXPIRY = struct.Struct('!d')
+
+class ResponseCache:
+    """LRU cache of rendered pages with a TTL, invalidated by writes
+
+    generation is a callable returning a value that changes whenever the
+    data changes; the app passes the write counters kept in the database
+    (Database.table_versions). It is part of every key, so after a write the
+    old pages are never served again and age out of the LRU; nothing has to
+    be deleted, and a hit costs one small read instead of the page's queries.
+
+    Because the counters live in the database, every worker process sees
+    every write at once, including those of a separate scrape process or
+    the archiver. With cache_dir, pages are also stored on disk so that
+    worker processes share them.
+    """
+
+    def __init__(self, generation, ttl=60, max_entries=256, cache_dir=None,
+                 max_disk_entries=1024):
+        self.generation = generation
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self._store = RenderCache(max_entries, cache_dir, max_disk_entries)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, route, args, generation=None):
+        """Cached body for route called with args, or None
+
+        Pass the generation read before rendering to get() and put() alike,
+        so a write that lands while a page renders cannot be cached under the
+        newer generation.
+        """
+        if generation is None:
+            generation = self.generation()
+        value = self._store.get((route, generation, args))
+        if value is not None and _EXPIRY.unpack_from(value)[0] > time.time():
+            with self._lock:
+                self.hits += 1
+            return value[_EXPIRY.size:]
+
+        with self._lock:
+            self.misses += 1
+            if value is not None:
+                self.expired += 1
+        return None
+
+    def put(self, route, args, body, generation=None):
+        """Store the body (bytes) returned for route called with args"""
+        if generation is None:
+            generation = self.generation()
+        value = _EXPIRY.pack(time.time() + self.ttl) + body
+        self._store.put((route, generation, args), value)
+
+    def clear(self):
+        """Drop every cached page"""
+        self._store.clear()
+
+    def stats(self):
+        """Hit/miss counters of this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'entries': len(self._store),
+                'ttl': self.ttl,
+                'shared': bool(self.cache_dir),
+            }
@@ -0,0 +1,209 @@
+import time
+import sqlite3
+import argparse
+import threading
+from database import refresh_stale_stats
+
+class RetentionPolicy:
+    """Keep the scrape database bounded in size
+
+    Raw observations are kept for raw_days. Older ones are folded into daily
+    min/avg/max rows per product in product_daily_prices and then deleted.
+    Every step commits on its own, so other writers are never blocked for
+    longer than one day's worth of rows or one vacuum step.
+    """
+
+    def __init__(self, db_path='ecommerce_data.db', raw_days=30, vacuum_pages=256,
+                 vacuum_pause=0.05):
+        self.db_path = db_path
+        self.raw_days = raw_days
+        self.vacuum_pages = vacuum_pages
+        self.vacuum_pause = vacuum_pause
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def downsample(self):
+        """Fold observations older than raw_days into daily rows, return rows removed"""
+        cutoff = time.time() - self.raw_days * 86400
+        # Only whole days are downsampled so a day is never split across runs
+        cutoff_day = time.strftime('%Y-%m-%d', time.gmtime(cutoff))
+
+        conn = self._connect()
+        removed = 0
+        try:
+            days = [row[0] for row in conn.execute('''
+            SELECT DISTINCT date(timestamp, 'unixepoch') FROM products
+            WHERE timestamp < CAST(strftime('%s', ?) AS REAL)
+            ORDER BY 1
+            ''', (cutoff_day,))]
+
+            for day in days:
+                bounds = (day, day)
+                # product_key is the products column that identifies "the same
+                # product" on a site (its URL, or its title without one)
+                conn.execute('''
+                INSERT INTO product_daily_prices
+                    (source_site, product_key, day, title, category, observations,
+                     price_count, min_price, avg_price, max_price, rating_count, avg_rating)
+                SELECT
+                    COALESCE(source_site, ''), product_key, ?, MAX(title), MAX(category),
+                    COUNT(*), COUNT(price), MIN(price), AVG(price), MAX(price),
+                    COUNT(rating), AVG(rating)
+                FROM products
+                WHERE timestamp >= CAST(strftime('%s', ?) AS REAL)
+                  AND timestamp < CAST(strftime('%s', ?, '+1 day') AS REAL)
+                GROUP BY 1, 2
+                ON CONFLICT (source_site, product_key, day) DO UPDATE SET
+                    observations = observations + excluded.observations,
+                    avg_price = CASE
+                        WHEN excluded.price_count = 0 THEN avg_price
+                        WHEN price_count = 0 THEN excluded.avg_price
+                        ELSE (avg_price * price_count + excluded.avg_price * excluded.price_count)
+                             / (price_count + excluded.price_count)
+                    END,
+                    price_count = price_count + excluded.price_count,
+                    min_price = MIN(COALESCE(min_price, excluded.min_price),
+                                    COALESCE(excluded.min_price, min_price)),
+                    max_price = MAX(COALESCE(max_price, excluded.max_price),
+                                    COALESCE(excluded.max_price, max_price)),
+                    avg_rating = CASE
+                        WHEN excluded.rating_count = 0 THEN avg_rating
+                        WHEN rating_count = 0 THEN excluded.avg_rating
+                        ELSE (avg_rating * rating_count + excluded.avg_rating * excluded.rating_count)
+                             / (rating_count + excluded.rating_count)
+                    END,
+                    rating_count = rating_count + excluded.rating_count
+                ''', (day, *bounds))
+
+                cursor = conn.execute('''
+                DELETE FROM products
+                WHERE timestamp >= CAST(strftime('%s', ?) AS REAL)
+                  AND timestamp < CAST(strftime('%s', ?, '+1 day') AS REAL)
+                ''', bounds)
+                removed += cursor.rowcount
+                refresh_stale_stats(conn)
+                conn.commit()
+        finally:
+            conn.close()
+
+        return removed
+
+    def purge_search_orphans(self):
+        """Rebuild the search index if it has entries without a product row
+
+        Returns True when the index was out of sync and had to be rebuilt.
+        """
+        conn = self._connect()
+        try:
+            try:
+                conn.execute(
+                    "INSERT INTO product_search (product_search, rank) VALUES ('integrity-check', 1)"
+                )
+                conn.commit()
+                return False
+            except sqlite3.DatabaseError:
+                conn.rollback()
+                conn.execute("INSERT INTO product_search (product_search) VALUES ('rebuild')")
+                conn.commit()
+                return True
+        finally:
+            conn.close()
+
+    def enable_incremental_vacuum(self):
+        """Switch an existing database to incremental auto-vacuum
+
+        This needs one full VACUUM, which rewrites the whole file, so it is a
+        one-off migration step rather than part of the regular run.
+        """
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+
+    def incremental_vacuum(self, max_steps=None):
+        """Release free pages in steps of vacuum_pages, return the pages freed"""
+        conn = self._connect()
+        freed = 0
+        steps = 0
+        try:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                print("⚠️  Incremental vacuum is not enabled for this database; "
+                      "run with --enable-incremental-vacuum once")
+                return 0
+
+            while max_steps is None or steps < max_steps:
+                free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                if free_pages == 0:
+                    break
+                conn.execute(f'PRAGMA incremental_vacuum({self.vacuum_pages})').fetchall()
+                freed += min(free_pages, self.vacuum_pages)
+                steps += 1
+                # Give waiting writers a chance to take the lock between steps
+                time.sleep(self.vacuum_pause)
+        finally:
+            conn.close()
+
+        return freed
+
+    def run(self):
+        """Apply the whole policy once and return a summary"""
+        summary = {
+            'downsampled_rows': self.downsample(),
+            'search_index_rebuilt': self.purge_search_orphans(),
+        }
+        summary['vacuumed_pages'] = self.incremental_vacuum()
+        return summary
+
+    def start_schedule(self, interval):
+        """Run the policy every interval seconds on a daemon thread
+
+        Returns a threading.Event; set it to stop the schedule.
+        """
+        stop_event = threading.Event()
+
+        def loop():
+            while not stop_event.wait(interval):
+                try:
+                    self.run()
+                except Exception as e:
+                    print(f"Retention run failed: {e}")
+
+        threading.Thread(target=loop, name='retention', daemon=True).start()
+        return stop_event
+
+
+def main():
+    """Apply the retention policy from the command line, once or on an interval"""
+    parser = argparse.ArgumentParser(description='Downsample and vacuum the scrape database')
+    parser.add_argument('--db', default='ecommerce_data.db', help='Path to the SQLite database')
+    parser.add_argument('--raw-days', type=int, default=30,
+                        help='Days of raw observations to keep')
+    parser.add_argument('--vacuum-pages', type=int, default=256,
+                        help='Pages released per incremental vacuum step')
+    parser.add_argument('--interval', type=int, default=0,
+                        help='Repeat every N seconds instead of running once')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='Convert an existing database to incremental vacuum (runs VACUUM)')
+    args = parser.parse_args()
+
+    policy = RetentionPolicy(args.db, raw_days=args.raw_days, vacuum_pages=args.vacuum_pages)
+
+    if args.enable_incremental_vacuum:
+        policy.enable_incremental_vacuum()
+        print("✅ Incremental vacuum enabled")
+
+    while True:
+        summary = policy.run()
+        print(f"🧹 Downsampled {summary['downsampled_rows']} rows, "
+              f"freed {summary['vacuumed_pages']} pages"
+              + (", rebuilt search index" if summary['search_index_rebuilt'] else ""))
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
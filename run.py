@@ -5,17 +5,29 @@ Simple run script for the E-commerce Web Scraper
 
 import os
 import sys
+import argparse
 import webbrowser
 import time
 from threading import Timer
 
-def open_browser():
+def open_browser(port=5000):
     """Open the browser after a short delay"""
     time.sleep(2)  # Wait for Flask to start
-    webbrowser.open('http://localhost:5000')
+    webbrowser.open(f'http://localhost:{port}')
 
 def main():
     """Main function to run the application"""
+    parser = argparse.ArgumentParser(description='Run the E-commerce Web Scraper')
+    parser.add_argument('--production', action='store_true',
+                        help='Serve with pre-forked worker processes (see serve.py)')
+    parser.add_argument('--workers', type=int,
+                        help='Worker processes in production mode (default: one per CPU core)')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, help='Port (default: 5000, or 8000 in production)')
+    args = parser.parse_args()
+    production = args.production or args.workers is not None
+    port = args.port or (8000 if production else 5000)
+    
     print("🚀 Starting E-commerce Web Scraper...")
     print("=" * 50)
     
@@ -39,19 +51,30 @@ def main():
         sys.exit(1)
     
     print("✅ All dependencies found")
+    
+    if production:
+        print("🌐 Starting production server...")
+        print(f"\n🔗 URL: http://{args.host}:{port}")
+        print("🔄 Send SIGHUP to the master process to reload the workers")
+        print("⏹️  Press Ctrl+C to stop the server")
+        print("=" * 50)
+        from serve import serve
+        serve(args.host, port, args.workers)
+        return
+    
     print("🌐 Starting web server...")
     print("📱 The application will open in your browser automatically")
-    print("\n🔗 URL: http://localhost:5000")
+    print(f"\n🔗 URL: http://localhost:{port}")
     print("⏹️  Press Ctrl+C to stop the server")
     print("=" * 50)
     
     # Open browser after a delay
-    Timer(2.0, open_browser).start()
+    Timer(2.0, open_browser, args=(port,)).start()
     
     # Import and run the Flask app
     try:
         from app import app
-        app.run(debug=True, use_reloader=False)
+        app.run(debug=True, host=args.host, port=port, use_reloader=False)
     except KeyboardInterrupt:
         print("\n👋 Server stopped. Goodbye!")
     except Exception as e:
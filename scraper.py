@@ -16,24 +16,30 @@ class EcommerceScraper:
     def scrape_product_listings(self, url, max_pages=1):
         """Scrape multiple pages of product listings"""
         all_products = []
+        page = 0
         
-        for page in range(1, max_pages + 1):
-            # Modify URL for pagination if needed
-            page_url = f"{url}?page={page}" if page > 1 else url
-            
-            try:
-                products = self._scrape_page(page_url)
+        try:
+            for page, products in self.iter_product_pages(url, max_pages):
                 all_products.extend(products)
-                
-                # Be nice to the server
-                time.sleep(random.uniform(1, 3))
-                
-            except Exception as e:
-                print(f"Error scraping page {page}: {e}")
-                break
+        except Exception as e:
+            print(f"Error scraping page {page + 1}: {e}")
         
         return all_products
     
+    def iter_product_pages(self, url, max_pages=1):
+        """Scrape listing pages one by one, yielding (page number, products)
+
+        Stops with the exception of the first page that cannot be fetched.
+        """
+        for page in range(1, max_pages + 1):
+            if page > 1:
+                # Be nice to the server
+                time.sleep(random.uniform(1, 3))
+            
+            # Modify URL for pagination if needed
+            page_url = f"{url}?page={page}" if page > 1 else url
+            yield page, self._scrape_page(page_url)
+    
     def _scrape_page(self, url):
         """Scrape a single page of product listings"""
         try:
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Pre-fork production server for the E-commerce Web Scraper
+
+The master process binds the listening socket and forks --workers worker
+processes that accept connections from it, each running a threaded WSGI
+server. Workers import app.py only after the fork and call
+init_components(), so every worker opens its own database connections,
+writer thread, job pool, render pool and caches.
+
+Signals sent to the master:
+    HUP         graceful reload: start fresh workers (with freshly imported
+                code), then let the old ones finish their requests and exit
+    TERM, INT   graceful shutdown, old workers are killed after --graceful-timeout
+    TTIN, TTOU  add or remove one worker
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import threading
+import traceback
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+# Exit status of a worker that could not load the app; the master gives up
+# instead of forking it again and again
+WORKER_BOOT_ERROR = 3
+
+def default_workers():
+    """One worker per CPU core"""
+    return os.cpu_count() or 1
+
+class RequestHandler(WSGIRequestHandler):
+    """Request handler with an idle keep-alive timeout and optional access log"""
+
+    # Seconds an idle keep-alive connection is kept; bounds how long a
+    # stopping worker waits for its connections to drain
+    timeout = 5
+    access_log = False
+
+    def log_request(self, code='-', size='-'):
+        if self.access_log:
+            super().log_request(code, size)
+
+def _boot_worker(listener, host, port, access_log, keep_alive, render_workers):
+    """Load the app in a freshly forked worker and create its server"""
+    import app as app_module
+    app_module.init_components(render_workers=render_workers)
+
+    handler = type('WorkerRequestHandler', (RequestHandler,),
+                   {'access_log': access_log, 'timeout': keep_alive})
+    server = make_server(host, port, app_module.app, threaded=True,
+                         request_handler=handler, fd=listener.fileno())
+    # Every worker is woken for each new connection but only one gets it; the
+    # others must not block in accept(), where they could not see shutdown()
+    server.socket.setblocking(False)
+    # server_close() then waits for the requests in progress
+    server.daemon_threads = False
+    return app_module, server
+
+def _run_worker(listener, host, port, access_log, keep_alive, render_workers):
+    """Body of a worker process; returns its exit status"""
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        if not stopping.is_set():
+            stopping.set()
+            # shutdown() waits for serve_forever() to return, so not from this thread
+            threading.Thread(target=server.shutdown).start()
+
+    # The master decides when workers stop; Ctrl+C reaches the whole process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTTIN, signal.SIG_DFL)
+    signal.signal(signal.SIGTTOU, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    try:
+        app_module, server = _boot_worker(listener, host, port, access_log, keep_alive,
+                                          render_workers)
+    except Exception:
+        traceback.print_exc()
+        return WORKER_BOOT_ERROR
+
+    signal.signal(signal.SIGTERM, stop)
+    print(f"👷 Worker {os.getpid()} ready")
+    try:
+        server.serve_forever()
+        server.server_close()
+        app_module.shutdown_components()
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+class Arbiter:
+    """Fork the worker processes and keep the configured number running"""
+
+    def __init__(self, host='127.0.0.1', port=8000, workers=None, graceful_timeout=30,
+                 keep_alive=5, access_log=False):
+        self.host = host
+        self.port = port
+        self.num_workers = workers or default_workers()
+        self.graceful_timeout = graceful_timeout
+        self.keep_alive = keep_alive
+        self.access_log = access_log
+        self.listener = None
+        # pid -> generation; a reload starts a new generation
+        self.workers = {}
+        self.generation = 0
+        # pid -> time after which a stopping worker is killed
+        self.stopping = {}
+        self._signals = []
+
+    def bind(self):
+        """Create the listening socket shared by all workers"""
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        self.listener = socket.create_server((self.host, self.port), family=family,
+                                             backlog=2048)
+        self.port = self.listener.getsockname()[1]
+        return self.listener
+
+    def spawn_worker(self):
+        # Unflushed output would otherwise be printed again by the child
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = self.generation
+            return pid
+
+        # Child: serve until told to stop, never return into the master's loop
+        status = 1
+        try:
+            status = _run_worker(self.listener, self.host, self.port, self.access_log,
+                                 self.keep_alive, self.render_workers())
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)
+
+    def render_workers(self):
+        """Chart render processes per worker, so all workers together use one per core"""
+        return max(1, (os.cpu_count() or 1) // self.num_workers)
+
+    def stop_worker(self, pid, sig=signal.SIGTERM):
+        self.stopping.setdefault(pid, time.monotonic() + self.graceful_timeout)
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def current_workers(self):
+        return sorted(pid for pid, generation in self.workers.items()
+                      if generation == self.generation and pid not in self.stopping)
+
+    def manage_workers(self):
+        """Start missing workers of the current generation and stop surplus ones"""
+        current = self.current_workers()
+        for _ in range(self.num_workers - len(current)):
+            self.spawn_worker()
+        for pid in current[:max(len(current) - self.num_workers, 0)]:
+            self.stop_worker(pid)
+        # After a reload, the previous generation drains once its replacements are forked
+        for pid, generation in list(self.workers.items()):
+            if generation != self.generation and pid not in self.stopping:
+                self.stop_worker(pid)
+
+    def reap_workers(self):
+        """Collect exited workers; returns False when a worker failed to boot"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return True
+            if not pid:
+                break
+            self.workers.pop(pid, None)
+            expected = self.stopping.pop(pid, None) is not None
+            code = os.waitstatus_to_exitcode(status)
+            if code == WORKER_BOOT_ERROR:
+                print(f"❌ Worker {pid} failed to boot, shutting down")
+                return False
+            if not expected:
+                print(f"⚠️  Worker {pid} exited with status {code}, starting a new one")
+
+        # Workers that ignore TERM past the graceful timeout are killed
+        now = time.monotonic()
+        for pid, deadline in list(self.stopping.items()):
+            if now > deadline:
+                self.stop_worker(pid, signal.SIGKILL)
+        return True
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def run(self):
+        """Serve until TERM or INT, then stop the workers gracefully"""
+        if self.listener is None:
+            self.bind()
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN,
+                    signal.SIGTTOU, signal.SIGCHLD):
+            signal.signal(sig, self._on_signal)
+
+        print(f"🚀 Master {os.getpid()} serving on http://{self.host}:{self.port} "
+              f"with {self.num_workers} workers")
+        running = True
+        while running:
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    running = False
+                elif signum == signal.SIGHUP:
+                    print("🔄 Reloading workers")
+                    self.generation += 1
+                elif signum == signal.SIGTTIN:
+                    self.num_workers += 1
+                elif signum == signal.SIGTTOU:
+                    self.num_workers = max(self.num_workers - 1, 1)
+            if not running or not self.reap_workers():
+                break
+            self.manage_workers()
+            # Signal handlers run between sleeps; SIGCHLD keeps respawns prompt
+            time.sleep(0.2)
+
+        self.shutdown()
+
+    def shutdown(self):
+        """Stop every worker, waiting up to graceful_timeout for requests to finish"""
+        print("⏹️  Stopping workers...")
+        for pid in list(self.workers):
+            self.stop_worker(pid)
+        while self.workers:
+            self.reap_workers()
+            time.sleep(0.1)
+        self.listener.close()
+        print("👋 Server stopped")
+
+def serve(host='127.0.0.1', port=8000, workers=None, graceful_timeout=30, keep_alive=5,
+          access_log=False):
+    """Run the app with pre-forked workers (or one threaded process without fork())"""
+    if not hasattr(os, 'fork'):
+        # e.g. Windows: no pre-fork, one process with a thread per request
+        from app import app
+        print("⚠️  fork() is not available, serving from a single process")
+        app.run(host=host, port=port, threaded=True, debug=False, use_reloader=False)
+        return
+    Arbiter(host, port, workers, graceful_timeout, keep_alive, access_log).run()
+
+def main():
+    """Start the production server from the command line"""
+    parser = argparse.ArgumentParser(description='Serve the web app with pre-forked workers')
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'),
+                        help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8000)),
+                        help='Port to listen on')
+    parser.add_argument('--workers', '-w', type=int,
+                        default=int(os.environ.get('WEB_WORKERS', 0)) or None,
+                        help='Worker processes (default: WEB_WORKERS or one per CPU core)')
+    parser.add_argument('--graceful-timeout', type=float, default=30,
+                        help='Seconds a stopping worker may take to finish its requests')
+    parser.add_argument('--keep-alive', type=float, default=5,
+                        help='Seconds an idle keep-alive connection stays open')
+    parser.add_argument('--access-log', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers, args.graceful_timeout, args.keep_alive,
+          args.access_log)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -49,9 +49,249 @@ document.addEventListener('DOMContentLoaded', function() {
     link.href = 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.5.0/font/bootstrap-icons.css';
     document.head.appendChild(link);
     
+    // Follow a background scrape started from the form (index.html)
+    const jobPanel = document.getElementById('job-progress');
+    if (jobPanel) {
+        streamJob(jobPanel, document.getElementById('job-products'));
+    }
+    
+    // Draw the dashboard charts in the browser (visualizations.html, client mode)
+    document.querySelectorAll('canvas[data-chart]').forEach(renderChart);
+    
     // Enable tooltips
     const tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
     tooltipTriggerList.map(function (tooltipTriggerEl) {
         return new bootstrap.Tooltip(tooltipTriggerEl);
     });
-});
\ No newline at end of file
+});
+
+// Swap a chart canvas for the server-rendered image; drop the card if that fails too
+function showChartImage(canvas) {
+    const img = document.createElement('img');
+    img.src = canvas.dataset.image;
+    img.className = 'img-fluid';
+    img.alt = canvas.getAttribute('aria-label');
+    img.onerror = function() {
+        this.closest('.mb-4').remove();
+    };
+    canvas.replaceWith(img);
+}
+
+// Fetch a chart's JSON series and draw it with Chart.js
+function renderChart(canvas) {
+    if (typeof Chart === 'undefined') {
+        showChartImage(canvas);
+        return;
+    }
+    
+    fetch(canvas.dataset.series)
+        .then(response => response.ok ? response.json() : Promise.reject(response.status))
+        .then(series => new Chart(canvas, chartConfig(canvas.dataset.chart, series)))
+        .catch(error => {
+            console.error('Chart error:', canvas.dataset.chart, error);
+            showChartImage(canvas);
+        });
+}
+
+// Chart.js configuration for each chart type served by /charts/<chart>.json
+function chartConfig(chart, series) {
+    const money = value => '$' + Number(value).toFixed(2);
+    
+    if (chart === 'price_comparison') {
+        return {
+            type: 'bar',
+            data: {
+                labels: series.sites,
+                datasets: [
+                    {label: 'Average price', data: series.avg_price, backgroundColor: '#3b528b'},
+                    {
+                        label: 'Min to max',
+                        data: series.min_price.map((min, i) => [min, series.max_price[i]]),
+                        backgroundColor: 'rgba(220, 53, 69, 0.25)'
+                    }
+                ]
+            },
+            options: {scales: {y: {title: {display: true, text: 'Price ($)'}, ticks: {callback: money}}}}
+        };
+    }
+    
+    if (chart === 'rating_comparison') {
+        return {
+            type: 'bar',
+            data: {
+                labels: series.sites,
+                datasets: [{label: 'Average rating', data: series.avg_rating, backgroundColor: '#21918c'}]
+            },
+            options: {scales: {y: {min: 0, max: 5, title: {display: true, text: 'Average Rating (out of 5)'}}}}
+        };
+    }
+    
+    if (chart === 'price_distribution') {
+        const labels = series.counts.map((_, i) => money(series.edges[i]) + ' - ' + money(series.edges[i + 1]));
+        return {
+            type: 'bar',
+            data: {
+                labels: labels,
+                datasets: [{label: 'Products', data: series.counts, backgroundColor: 'skyblue'}]
+            },
+            options: {
+                plugins: {title: {display: true, text: 'Mean: ' + money(series.mean)}},
+                scales: {y: {title: {display: true, text: 'Number of Products'}}}
+            }
+        };
+    }
+    
+    if (chart === 'price_vs_rating') {
+        const datasets = [{
+            type: 'scatter',
+            label: series.points.length + ' of ' + series.total + ' products',
+            data: series.points.map(point => ({x: point[0], y: point[1]})),
+            backgroundColor: 'rgba(59, 82, 139, 0.5)'
+        }];
+        if (series.fit) {
+            datasets.push({
+                type: 'line',
+                label: 'Trend',
+                data: [0, 5].map(x => ({x: x, y: series.fit.intercept + series.fit.slope * x})),
+                borderColor: 'red',
+                pointRadius: 0
+            });
+        }
+        if (series.quantiles && series.quantiles.rating.length) {
+            datasets.push({
+                type: 'line',
+                label: 'Median',
+                data: series.quantiles.rating.map((x, i) => ({x: x, y: series.quantiles.median[i]})),
+                borderColor: 'orange',
+                backgroundColor: 'orange'
+            });
+        }
+        return {
+            type: 'scatter',
+            data: {datasets: datasets},
+            options: {
+                scales: {
+                    x: {min: 0, max: 5, title: {display: true, text: 'Rating'}},
+                    y: {title: {display: true, text: 'Price ($)'}, ticks: {callback: money}}
+                }
+            }
+        };
+    }
+    
+    if (chart === 'price_trends') {
+        return {
+            type: 'line',
+            data: {
+                labels: series.dates,
+                datasets: [{label: 'Average price', data: series.price, borderColor: '#3b528b', pointRadius: 3}]
+            },
+            options: {scales: {y: {title: {display: true, text: 'Average Price ($)'}, ticks: {callback: money}}}}
+        };
+    }
+    
+    throw new Error('Unknown chart type: ' + chart);
+}
+
+// Follow a crawl over Server-Sent Events, listing products as each page is parsed
+function streamJob(panel, list) {
+    if (typeof EventSource === 'undefined') {
+        trackJob(panel);
+        return;
+    }
+    
+    const source = new EventSource(panel.dataset.streamUrl);
+    const update = event => showJobProgress(panel, JSON.parse(event.data).job);
+    ['started', 'saved', 'error'].forEach(name => source.addEventListener(name, update));
+    source.addEventListener('page', event => {
+        const data = JSON.parse(event.data);
+        showJobProgress(panel, data.job);
+        data.products.forEach(product => list.appendChild(productItem(product)));
+    });
+    source.addEventListener('done', event => {
+        source.close();
+        update(event);
+    });
+    source.onerror = () => {
+        // EventSource reconnects by itself unless the server refused the stream
+        if (source.readyState === EventSource.CLOSED) {
+            trackJob(panel);
+        }
+    };
+}
+
+// One scraped product as a list item; scraped text is never parsed as HTML
+function productItem(product) {
+    const item = document.createElement('li');
+    item.className = 'list-group-item d-flex justify-content-between';
+    
+    const title = document.createElement(product.url && /^https?:/.test(product.url) ? 'a' : 'span');
+    title.textContent = product.title;
+    if (title.tagName === 'A') {
+        title.href = product.url;
+        title.target = '_blank';
+        title.rel = 'noopener';
+    }
+    
+    const price = document.createElement('span');
+    price.className = 'text-muted';
+    price.textContent = product.price == null ? '' : '$' + Number(product.price).toFixed(2);
+    
+    item.append(title, price);
+    return item;
+}
+
+// Poll /jobs/<id> and show the crawl's progress until it finishes
+function trackJob(panel) {
+    const status = panel.querySelector('.job-status');
+    const eta = panel.querySelector('.job-eta');
+    const bar = panel.querySelector('.progress-bar');
+    
+    fetch(panel.dataset.jobUrl)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Unknown job');
+            }
+            return response.json();
+        })
+        .then(job => {
+            showJobProgress(panel, job);
+            if (job.status === 'queued' || job.status === 'running') {
+                setTimeout(() => trackJob(panel), 2000);
+            }
+        })
+        .catch(error => {
+            status.textContent = 'Could not load the scrape progress: ' + error.message;
+            eta.textContent = '';
+            bar.parentElement.remove();
+        });
+}
+
+function showJobProgress(panel, job) {
+    const status = panel.querySelector('.job-status');
+    const eta = panel.querySelector('.job-eta');
+    const bar = panel.querySelector('.progress-bar');
+    
+    bar.style.width = Math.round(100 * job.pages_done / job.max_pages) + '%';
+    if (job.status === 'queued') {
+        status.textContent = 'Waiting for a free scraper...';
+    } else if (job.status === 'running') {
+        status.textContent = 'Page ' + job.pages_done + ' of ' + job.max_pages + ' done, '
+            + job.products_saved + ' products saved';
+        eta.textContent = job.eta === null ? '' : 'about ' + Math.ceil(job.eta) + 's left';
+    } else {
+        bar.classList.remove('progress-bar-animated', 'progress-bar-striped');
+        bar.style.width = '100%';
+        eta.textContent = '';
+        if (job.status === 'failed') {
+            panel.className = 'alert alert-danger';
+            status.textContent = 'Scraping failed: ' + job.errors.join('; ');
+        } else if (job.products_saved === 0) {
+            panel.className = 'alert alert-warning';
+            status.textContent = 'No products found. Try adjusting the scraper settings.';
+        } else {
+            panel.className = 'alert alert-success';
+            status.innerHTML = 'Successfully scraped ' + job.products_saved + ' products. '
+                + '<a href="' + panel.dataset.resultsUrl + '">View results</a>';
+        }
+    }
+}
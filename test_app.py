@@ -3,7 +3,11 @@
 Test script to verify the application components work correctly
 """
 
+import os
 import sys
+import json
+import sqlite3
+import tempfile
 import traceback
 
 def test_imports():
@@ -132,6 +136,770 @@ def test_database():
         traceback.print_exc()
         return False
 
+def test_search_index():
+    """Test that the full-text index follows edits and deletes and stays consistent"""
+    print("\nTesting search index...")
+    
+    try:
+        from database import Database
+        db = Database(os.path.join(tempfile.mkdtemp(), 'test.db'))
+        db.save_products([
+            {'title': 'Galaxy Phone', 'price': 500.0, 'description': 'Android flagship'},
+            {'title': 'Pixel Tablet', 'price': 300.0},
+        ], 'site-a', 'phones')
+        
+        def titles(query, **kwargs):
+            return [p['title'] for p in db.search_products(query, **kwargs)]
+        
+        assert titles('android') == ['Galaxy Phone']
+        assert titles('tab') == [] and titles('tab', prefix=True) == ['Pixel Tablet']
+        
+        conn = sqlite3.connect(db.db_path)
+        conn.execute("UPDATE products SET title = 'Nova Phone' WHERE title = 'Galaxy Phone'")
+        conn.execute("DELETE FROM products WHERE title = 'Pixel Tablet'")
+        conn.commit()
+        assert titles('galaxy') == [] and titles('pixel') == []
+        assert titles('nov pho', prefix=True) == ['Nova Phone']
+        assert titles('android') == ['Nova Phone']
+        
+        assert db.optimize_search_index(pages_per_step=1) >= 1
+        # Raises if the index disagrees with the products it was built from
+        conn.execute("INSERT INTO product_search (product_search, rank) VALUES ('integrity-check', 1)")
+        conn.close()
+        print("✅ Search index test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Search index test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_aggregate_stats():
+    """Test that the incremental stats tables match a full recomputation"""
+    print("\nTesting aggregate stats...")
+    
+    try:
+        from database import Database
+        db_path = os.path.join(tempfile.mkdtemp(), 'stats_test.db')
+        db = Database(db_path)
+        
+        db.save_products([
+            {'title': 'A', 'price': 10.0, 'rating': 4.0, 'timestamp': 1700000000},
+            {'title': 'B', 'price': 30.0, 'rating': None, 'timestamp': 1700000000},
+            {'title': 'C', 'price': None, 'rating': 2.0, 'timestamp': 1700090000},
+        ], 'site-a', 'phones')
+        
+        price_stats = db.get_price_stats(category='phones')
+        row = price_stats.iloc[0]
+        assert row['count'] == 3
+        assert row['avg_price'] == 20.0
+        assert (row['min_price'], row['max_price']) == (10.0, 30.0)
+        
+        rating_stats = db.get_rating_stats()
+        assert rating_stats.iloc[0]['avg_rating'] == 3.0
+        
+        db.rebuild_stats()
+        assert db.get_price_stats(category='phones').equals(price_stats)
+        
+        # Deleting the bucket's minimum only flags it until the batch refresh
+        from database import refresh_stale_stats
+        conn = sqlite3.connect(db_path)
+        conn.execute("DELETE FROM products WHERE title = 'A'")
+        assert conn.execute('SELECT COUNT(*) FROM daily_site_stats WHERE minmax_stale').fetchone()[0] == 1
+        assert refresh_stale_stats(conn) == 1
+        conn.commit()
+        conn.close()
+        row = db.get_price_stats(category='phones').iloc[0]
+        assert (row['count'], row['min_price'], row['max_price']) == (2, 30.0, 30.0)
+        print("✅ Aggregate stats test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Aggregate stats test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_exporter():
+    """Test that every export format writes all rows, filters and rejects empty exports"""
+    print("\nTesting exporter...")
+    
+    cwd = os.getcwd()
+    try:
+        import csv
+        from database import Database
+        from exporter import Exporter, PARQUET_AVAILABLE
+        workdir = tempfile.mkdtemp()
+        db = Database(os.path.join(workdir, 'test.db'))
+        db.save_products([
+            {'title': f'Phone {i}', 'price': float(i), 'description': 'Fast', 'timestamp': 1700000000}
+            for i in range(5)
+        ], 'site-a', 'phones')
+        db.save_products([{'title': 'Tablet', 'price': 99.0}], 'site-a', 'tablets')
+        
+        # Exports are written under ./exports
+        os.chdir(workdir)
+        exporter = Exporter(db.db_path, chunk_size=2)
+        
+        with open(exporter.export('csv', 'all.csv'), newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        assert len(rows) == 6 and rows[0]['description'] == 'Fast'
+        assert rows[0]['date'] == '2023-11-14 22:13:20'
+        
+        with open(exporter.export('ndjson', category='phones'), encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        assert [r['title'] for r in records] == [f'Phone {i}' for i in range(5)]
+        
+        from openpyxl import load_workbook
+        sheet = load_workbook(exporter.export('xlsx', category='tablets'), read_only=True).active
+        assert [row[0] for row in sheet.iter_rows(values_only=True)] == ['title', 'Tablet']
+        
+        if PARQUET_AVAILABLE:
+            import pyarrow.parquet as pq
+            assert pq.read_table(exporter.export('parquet', category='phones')).num_rows == 5
+        
+        try:
+            exporter.export('csv', 'none.csv', category='laptops')
+            raise AssertionError("Empty export did not raise")
+        except ValueError as e:
+            assert str(e) == "No data to export"
+        assert not os.path.exists('exports/none.csv')
+        print("✅ Exporter test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Exporter test failed: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        os.chdir(cwd)
+
+def test_retention():
+    """Test that downsampling folds old rows into daily prices and vacuum is stepwise"""
+    print("\nTesting retention...")
+    
+    try:
+        import time
+        from database import Database
+        from retention import RetentionPolicy
+        db = Database(os.path.join(tempfile.mkdtemp(), 'test.db'))
+        
+        # An hour into a day 40 days back, so all old rows fall on the same day
+        old = (time.time() // 86400 - 40) * 86400 + 3600
+        db.save_products([
+            {'title': 'Phone', 'url': 'https://shop.example/1', 'price': 10.0, 'rating': 4.0,
+             'timestamp': old},
+            {'title': 'Phone (new title)', 'url': 'https://shop.example/1', 'price': 30.0,
+             'rating': None, 'timestamp': old + 60},
+            {'title': 'Tablet', 'price': 20.0, 'timestamp': old + 120},
+            {'title': 'Phone', 'url': 'https://shop.example/1', 'price': 25.0,
+             'timestamp': time.time()},
+        ], 'site-a', 'phones')
+        
+        policy = RetentionPolicy(db.db_path, raw_days=30, vacuum_pages=1, vacuum_pause=0)
+        assert policy.downsample() == 3
+        assert [p['price'] for p in db.get_products()] == [25.0]
+        
+        conn = sqlite3.connect(db.db_path)
+        rows = conn.execute('''
+        SELECT product_key, observations, min_price, avg_price, max_price, avg_rating
+        FROM product_daily_prices ORDER BY product_key
+        ''').fetchall()
+        assert rows == [
+            ('site-a|Tablet', 1, 20.0, 20.0, 20.0, None),
+            ('site-a|https://shop.example/1', 2, 10.0, 20.0, 30.0, 4.0),
+        ], rows
+        
+        # Free some pages, then release only max_steps * vacuum_pages of them
+        conn.execute('CREATE TABLE filler (data BLOB)')
+        conn.executemany('INSERT INTO filler VALUES (?)', [(b'x' * 4000,) for _ in range(50)])
+        conn.commit()
+        conn.execute('DROP TABLE filler')
+        conn.commit()
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        assert free_pages > 2
+        assert policy.incremental_vacuum(max_steps=2) == 2
+        assert conn.execute('PRAGMA freelist_count').fetchone()[0] == free_pages - 2
+        conn.close()
+        print("✅ Retention test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Retention test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_writer():
+    """Test that the writer thread coalesces concurrent submissions"""
+    print("\nTesting database writer...")
+    
+    try:
+        import threading
+        from database import Database
+        from writer import DatabaseWriter
+        db = Database(os.path.join(tempfile.mkdtemp(), 'writer_test.db'))
+        writer = DatabaseWriter(db, max_batch_rows=100, max_delay=0.2)
+        
+        futures = []
+        def produce(site):
+            for i in range(10):
+                batch = [{'title': f'{site} item {i}', 'price': 1.0, 'timestamp': 1700000000}]
+                futures.append(writer.submit(batch, site, 'test-category'))
+        
+        # Request threads keep reading through the same Database while the writer commits
+        errors = []
+        stop = threading.Event()
+        def read():
+            while not stop.is_set():
+                try:
+                    db.get_products(limit=5)
+                    db.get_price_stats()
+                except Exception as e:
+                    errors.append(e)
+        
+        readers = [threading.Thread(target=read) for _ in range(3)]
+        threads = [threading.Thread(target=produce, args=(f'site-{n}',)) for n in range(4)]
+        for thread in readers + threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert writer.flush().result(timeout=10)
+        stop.set()
+        for thread in readers:
+            thread.join(timeout=10)
+        assert not errors, errors
+        assert sum(future.result() for future in futures) == 40
+        assert len(db.get_products(limit=100)) == 40
+        writer.close(timeout=10)
+        print("✅ Database writer test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Database writer test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_change_feed():
+    """Test that price changes are detected on ingest"""
+    print("\nTesting change feed...")
+    
+    try:
+        from database import Database
+        db = Database(os.path.join(tempfile.mkdtemp(), 'changes_test.db'))
+        
+        db.save_products([{'title': 'Phone', 'url': '/phone', 'price': 100.0, 'timestamp': 1}], 'site-a')
+        db.save_products([{'title': 'Phone', 'url': '/phone', 'price': 100.0, 'timestamp': 2}], 'site-a')
+        db.save_products([{'title': 'Phone', 'url': '/phone', 'price': 90.0, 'timestamp': 3}], 'site-a')
+        
+        changes = db.changes_since(0)
+        assert len(changes) == 1
+        assert (changes[0]['old_price'], changes[0]['new_price']) == (100.0, 90.0)
+        assert db.changes_since(changes[0]['seq']) == []
+        print("✅ Change feed test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Change feed test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_product_details():
+    """Test that descriptions and extra data round-trip through product_details"""
+    print("\nTesting product details storage...")
+    
+    try:
+        from database import Database, DEFAULT_COLUMNS
+        db = Database(os.path.join(tempfile.mkdtemp(), 'details_test.db'))
+        
+        db.save_products([{'title': 'Phone', 'description': 'A fine phone', 'brand': 'Acme'}], 'site-a')
+        
+        assert 'description' not in db.get_products()[0]
+        product = db.get_products(columns=DEFAULT_COLUMNS + ['description', 'additional_data'])[0]
+        assert product['description'] == 'A fine phone'
+        assert json.loads(product['additional_data']) == {'brand': 'Acme'}
+        assert db.search_products('fine')[0]['title'] == 'Phone'
+        assert len(db.get_products(attributes={'brand': 'Acme'})) == 1
+        print("✅ Product details test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Product details test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_matching():
+    """Test that products are grouped across sites without chaining same-site products"""
+    print("\nTesting product matching...")
+    
+    try:
+        from database import Database
+        db = Database(os.path.join(tempfile.mkdtemp(), 'matching_test.db'))
+        
+        # The two storage sizes are similar enough to be LSH matches of each other
+        small = 'Apple iPhone 13 128GB Midnight Unlocked Smartphone'
+        large = 'Apple iPhone 13 256GB Midnight Unlocked Smartphone'
+        db.save_products([
+            {'title': small, 'url': '/a/128', 'price': 700.0},
+            {'title': large, 'url': '/a/256', 'price': 800.0},
+        ], 'site-a', 'phones')
+        db.save_products([{'title': small, 'url': '/b/128', 'price': 680.0}], 'site-b', 'phones')
+        db.save_products([
+            {'title': 'Apple iPhone 13 (128GB) Midnight Unlocked Smartphone', 'url': '/a/128',
+             'price': 690.0},
+        ], 'site-a', 'phones')
+        
+        # Saving does not match; the background step does
+        conn = sqlite3.connect(db.db_path)
+        assert conn.execute('SELECT COUNT(*) FROM product_groups').fetchone()[0] == 0
+        assert db.match_pending(batch_size=2) == 2
+        assert db.match_pending(batch_size=2) == 2
+        assert db.match_pending(batch_size=2) == 0
+        
+        groups = dict(conn.execute('SELECT product_id, group_id FROM product_groups'))
+        same_site = conn.execute('''
+        SELECT COUNT(*) FROM product_matches m
+        JOIN products a ON a.id = m.product_id JOIN products b ON b.id = m.match_id
+        WHERE a.source_site = b.source_site
+        ''').fetchone()[0]
+        conn.close()
+        
+        assert groups[1] == groups[3] == groups[4]
+        assert groups[2] != groups[1]
+        assert same_site == 0
+        
+        matched = db.get_matched_prices(category='phones')
+        assert set(matched['source_site']) == {'site-a', 'site-b'}
+        assert matched.set_index('source_site').loc['site-a', 'observations'] == 2
+        print("✅ Product matching test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Product matching test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_chart_aggregates():
+    """Test that chart inputs are binned, summarised and sampled in SQL"""
+    print("\nTesting chart aggregates...")
+    
+    try:
+        from database import Database
+        db = Database(os.path.join(tempfile.mkdtemp(), 'test.db'))
+        
+        db.save_products([
+            {'title': f'Item {i}', 'price': float(i), 'rating': 1.0 + (i % 5)}
+            for i in range(1, 101)
+        ], 'site-a', 'phones')
+        
+        histogram = db.price_histogram('phones', bins=10)
+        assert len(histogram) == 10 and histogram['count'].sum() == 100
+        assert histogram['price_sum'].sum() == sum(range(1, 101))
+        
+        summary = db.price_rating_summary('phones', sample_size=20)
+        assert summary['count'] == 100 and len(summary['sample']) == 20
+        assert summary['density']['count'].sum() == 100
+        assert summary['quantiles']['count'].sum() == 100
+        assert db.price_rating_summary('other')['count'] == 0
+        print("✅ Chart aggregates test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Chart aggregates test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_chart_cache():
+    """Test that rendered charts are reused per data fingerprint, also across restarts"""
+    print("\nTesting chart cache...")
+    
+    try:
+        import pandas as pd
+        from visualizer import Visualizer
+        cache_dir = tempfile.mkdtemp()
+        df = pd.DataFrame({'source_site': ['site-a'], 'count': [2], 'avg_price': [15.0],
+                           'min_price': [10.0], 'max_price': [20.0]})
+        loads = []
+        
+        def load_data():
+            loads.append(1)
+            return df
+        
+        visualizer = Visualizer(cache_dir=cache_dir)
+        first = visualizer.cached_chart('price_comparison', load_data, fingerprint='1', fmt='json')
+        assert visualizer.cached_chart('price_comparison', load_data, fingerprint='1', fmt='json') == first
+        assert len(loads) == 1
+        visualizer.cached_chart('price_comparison', load_data, fingerprint='2', fmt='json')
+        assert len(loads) == 2
+        
+        # A new process finds the render on disk; empty data is cached as "no chart"
+        restarted = Visualizer(cache_dir=cache_dir)
+        assert restarted.cached_chart('price_comparison', load_data, fingerprint='1', fmt='json') == first
+        assert restarted.cached_chart('price_comparison', lambda: df.head(0), fingerprint='3',
+                                      fmt='json') is None
+        assert restarted.cached_chart('price_comparison', load_data, fingerprint='3', fmt='json') is None
+        assert len(loads) == 2
+        print("✅ Chart cache test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Chart cache test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_chart_endpoints():
+    """Test the ETags, caching headers and JSON series of /charts"""
+    print("\nTesting chart endpoints...")
+    
+    import app as app_module
+    from database import Database
+    from analytics import AnalyticsEngine
+    from visualizer import Visualizer
+    app_module.init_components()
+    originals = app_module.database, app_module.analytics, app_module.visualizer
+    try:
+        db = Database(os.path.join(tempfile.mkdtemp(), 'test.db'))
+        db.save_products([
+            {'title': 'Phone A', 'price': 10.0, 'rating': 4.0, 'timestamp': 86400 * 20000},
+            {'title': 'Phone B', 'price': 20.0, 'rating': 5.0, 'timestamp': 86400 * 20000 + 3600},
+        ], 'site-a', 'phones')
+        app_module.database = db
+        app_module.analytics = AnalyticsEngine(db)
+        app_module.visualizer = Visualizer(cache_dir=tempfile.mkdtemp())
+        client = app_module.app.test_client()
+        
+        response = client.get('/charts/price_comparison.json')
+        assert response.status_code == 200 and 'no-cache' in response.headers['Cache-Control']
+        assert response.get_json()['avg_price'] == [15.0]
+        etag = response.headers['ETag']
+        headers = {'If-None-Match': etag}
+        assert client.get('/charts/price_comparison.json', headers=headers).status_code == 304
+        
+        # URLs carrying the current fingerprint can be kept by the browser
+        fingerprint = db.data_fingerprint()
+        response = client.get(f'/charts/price_comparison.json?v={fingerprint}')
+        assert response.headers['Cache-Control'] == 'public, max-age=86400'
+        trend = client.get('/charts/price_trends.json').get_json()
+        assert trend['dates'] == ['2024-10-04 00:00', '2024-10-04 01:00'], trend
+        
+        db.save_products([{'title': 'Phone C', 'price': 60.0}], 'site-a', 'phones')
+        response = client.get('/charts/price_comparison.json', headers=headers)
+        assert response.status_code == 200 and response.headers['ETag'] != etag
+        assert response.get_json()['avg_price'] == [30.0]
+        
+        assert client.get('/charts/price_comparison.json?category=laptops').status_code == 404
+        assert client.get('/charts/pie.json').status_code == 404
+        assert client.get('/charts/price_comparison.gif').status_code == 404
+        print("✅ Chart endpoints test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Chart endpoints test failed: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        app_module.database, app_module.analytics, app_module.visualizer = originals
+
+def test_render_pool():
+    """Test that charts render in spawned workers and fall back in-process"""
+    print("\nTesting render pool...")
+    
+    from visualizer import Visualizer, RenderPool, VISUALIZATION_AVAILABLE
+    if not VISUALIZATION_AVAILABLE:
+        print("⚠️  matplotlib is not installed, skipping the render pool test")
+        return True
+    
+    pool = RenderPool(workers=1)
+    try:
+        import pandas as pd
+        from concurrent.futures.process import BrokenProcessPool
+        df = pd.DataFrame({'source_site': ['site-a', 'site-b'], 'count': [2, 1],
+                           'avg_price': [15.0, 30.0], 'min_price': [10.0, 30.0],
+                           'max_price': [20.0, 30.0]})
+        
+        assert pool.render('price_comparison', df).startswith(b'\x89PNG')
+        assert b'<svg' in pool.render('price_comparison', df, fmt='svg')
+        
+        class BrokenPool:
+            def render(self, chart_type, df, fmt='png'):
+                raise BrokenProcessPool("worker died")
+        
+        image = Visualizer(render_pool=BrokenPool()).cached_chart('price_comparison', lambda: df)
+        assert image.startswith(b'\x89PNG')
+        print("✅ Render pool test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Render pool test failed: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        pool.shutdown()
+
+def test_price_rollups():
+    """Test that price rollups follow inserts and outlive deleted rows"""
+    print("\nTesting price rollups...")
+    
+    try:
+        from database import Database
+        db = Database(os.path.join(tempfile.mkdtemp(), 'test.db'))
+        
+        day = 86400 * 20000
+        db.save_products([
+            {'title': 'Phone A', 'price': 10.0, 'timestamp': day + 60},
+            {'title': 'Phone B', 'price': 30.0, 'timestamp': day + 7200},
+            {'title': 'Phone C', 'price': 50.0, 'timestamp': day + 86400},
+        ], 'site-a', 'phones')
+        
+        hourly = db.price_series(day, day + 86400, 'hour')
+        assert list(hourly['price']) == [10.0, 30.0]
+        daily = db.price_series(resolution='day', category='phones')
+        assert list(daily['count']) == [2, 1] and list(daily['max_price']) == [30.0, 50.0]
+        assert db.series_resolution(day, day + 3 * 86400) == 'hour'
+        
+        # A later batch is merged into the existing buckets, unpriced rows skipped
+        db.save_products([
+            {'title': 'Phone D', 'price': 20.0, 'timestamp': day + 120},
+            {'title': 'Phone E', 'price': None, 'timestamp': day + 180},
+        ], 'site-a', 'phones')
+        hourly = db.price_series(day, day + 86400, 'hour')
+        assert list(hourly['price']) == [15.0, 30.0] and list(hourly['count']) == [2, 1]
+        assert list(db.price_series(resolution='day')['min_price']) == [10.0, 50.0]
+        
+        # Chart labels follow the resolution of the series
+        from visualizer import Visualizer
+        trend = hourly.rename(columns={'time': 'date'})[['date', 'price']]
+        assert Visualizer().series('price_trends', trend)['dates'][1].endswith(' 02:00')
+        trend = daily.rename(columns={'time': 'date'})[['date', 'price']]
+        assert len(Visualizer().series('price_trends', trend)['dates'][0]) == 10
+        
+        # A rebuild from the oldest live row keeps the hours before it
+        conn = sqlite3.connect(db.db_path)
+        conn.execute("DELETE FROM products WHERE title = 'Phone A'")
+        conn.commit()
+        db.rebuild_rollups()
+        assert list(db.price_series(day, day + 86400, 'hour')['price']) == [15.0, 30.0]
+        assert list(db.price_series(resolution='day')['count']) == [3, 1]
+        
+        conn.execute('DELETE FROM products')
+        conn.commit()
+        conn.close()
+        assert db.price_series(resolution='week')['count'].sum() == 4
+        print("✅ Price rollups test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Price rollups test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_scrape_jobs():
+    """Test that scrape jobs run in the background and report progress"""
+    print("\nTesting background scrape jobs...")
+    
+    try:
+        from database import Database
+        from writer import DatabaseWriter
+        from jobs import JobManager
+        
+        class PageScraper:
+            def iter_product_pages(self, url, max_pages=1):
+                for page in range(1, max_pages + 1):
+                    if page == 3:
+                        raise Exception("Network error")
+                    yield page, [{'title': f'Item {page}', 'price': float(page)}]
+        
+        db = Database(os.path.join(tempfile.mkdtemp(), 'test.db'))
+        writer = DatabaseWriter(db, max_delay=0.05)
+        manager = JobManager(PageScraper, writer, max_workers=2)
+        
+        complete = manager.submit('https://shop.example/list', 'phones', 2)
+        partial = manager.submit('https://shop.example/list', 'phones', 5)
+        manager.shutdown()
+        writer.close()
+        
+        assert manager.get(complete.id).to_dict()['status'] == 'finished'
+        assert complete.pages_done == 2 and complete.products_saved == 2 and not complete.errors
+        assert partial.status == 'finished' and partial.pages_done == 2 and len(partial.errors) == 1
+        assert len(db.get_products(category='phones')) == 4
+        
+        events = [e['event'] for e in complete.wait_events()]
+        assert events[0] == 'started' and events[-1] == 'done' and events.count('page') == 2
+        assert complete.wait_events(len(events) - 1)[0]['data']['job']['status'] == 'finished'
+        assert 'error' in [e['event'] for e in partial.wait_events()]
+        print("✅ Scrape jobs test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Scrape jobs test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_json_api():
+    """Test cursor paging, field selection, ETags and compression of the JSON API"""
+    print("\nTesting JSON API...")
+    
+    import app as app_module
+    from database import Database
+    app_module.init_components()
+    original = app_module.database
+    try:
+        db = Database(os.path.join(tempfile.mkdtemp(), 'test.db'))
+        db.save_products([
+            {'title': f'Phone {i}', 'price': float(i), 'description': 'x' * 100}
+            for i in range(1, 6)
+        ], 'site-a', 'phones')
+        app_module.database = db
+        client = app_module.app.test_client()
+        
+        first = client.get('/api/products?fields=title,price&limit=3').get_json()
+        assert [p['title'] for p in first['products']] == ['Phone 5', 'Phone 4', 'Phone 3']
+        assert set(first['products'][0]) == {'title', 'price'}
+        rest = client.get(f"/api/products?fields=title&limit=3&cursor={first['next_cursor']}")
+        assert [p['title'] for p in rest.get_json()['products']] == ['Phone 2', 'Phone 1']
+        assert rest.get_json()['next_cursor'] is None
+        assert client.get('/api/products?fields=password').status_code == 400
+        
+        response = client.get('/api/products?fields=title,description',
+                              headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        etag = response.headers['ETag']
+        headers = {'If-None-Match': etag}
+        assert client.get('/api/products?fields=title,description', headers=headers).status_code == 304
+        
+        db.save_products([{'title': 'Phone 6', 'price': 6.0}], 'site-a', 'phones')
+        assert client.get('/api/products?fields=title,description', headers=headers).status_code == 200
+        assert len(client.get('/api/search?q=phone&limit=2').get_json()['products']) == 2
+        assert client.get('/api/search?q=%22unbalanced').status_code == 400
+        assert client.get('/search?query=AND').status_code == 400
+        print("✅ JSON API test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ JSON API test failed: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        app_module.database = original
+
+def test_response_cache():
+    """Test that cached pages expire, follow the write counters and are shared on disk"""
+    print("\nTesting response cache...")
+    
+    try:
+        import time
+        from response_cache import ResponseCache
+        
+        generation = [0]
+        cache = ResponseCache(lambda: generation[0], ttl=60)
+        cache.put('results', (), b'page')
+        assert cache.get('results', ()) == b'page'
+        generation[0] += 1
+        assert cache.get('results', ()) is None
+        
+        expiring = ResponseCache(lambda: 0, ttl=0)
+        expiring.put('search', (('query', 'phone'),), b'page')
+        time.sleep(0.01)
+        assert expiring.get('search', (('query', 'phone'),)) is None and expiring.expired == 1
+        
+        # Two workers, each with its own Database on the same file, share pages
+        # and both see a save made through a third one
+        from database import Database
+        cache_dir = tempfile.mkdtemp()
+        db_path = os.path.join(cache_dir, 'cache_test.db')
+        def versions(db):
+            return lambda: tuple(sorted(db.table_versions().items()))
+        worker_a = ResponseCache(versions(Database(db_path)), cache_dir=cache_dir)
+        worker_b = ResponseCache(versions(Database(db_path)), cache_dir=cache_dir)
+        worker_a.put('results', (), b'old')
+        assert worker_b.get('results', ()) == b'old'
+        Database(db_path).save_products([{'title': 'Phone', 'price': 1.0}], 'site-a')
+        assert worker_a.get('results', ()) is None and worker_b.get('results', ()) is None
+        assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+        print("✅ Response cache test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Response cache test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_prefork_server():
+    """Test that serve.py workers answer requests, reload on SIGHUP and stop on SIGTERM"""
+    print("\nTesting pre-fork server...")
+    
+    if not hasattr(os, 'fork'):
+        print("⚠️  fork() is not available, skipping the pre-fork server test")
+        return True
+    
+    import time
+    import signal
+    import socket
+    import subprocess
+    import urllib.request
+    from jobs import JobManager
+    
+    process = None
+    try:
+        # Workers share job snapshots through state_dir
+        class EmptyScraper:
+            def iter_product_pages(self, url, max_pages=1):
+                yield 1, []
+        
+        state_dir = tempfile.mkdtemp()
+        owner = JobManager(EmptyScraper, None, state_dir=state_dir)
+        job = owner.submit('https://shop.example/list', 'phones')
+        owner.shutdown()
+        other = JobManager(EmptyScraper, None, state_dir=state_dir)
+        assert other.status(job.id)['status'] == 'finished'
+        assert [snapshot['id'] for snapshot in other.statuses()] == [job.id]
+        assert other.status('../etc/passwd') is None
+        
+        # The render pools of all workers together use one process per core
+        from serve import Arbiter
+        cores = os.cpu_count() or 1
+        assert Arbiter(workers=1).render_workers() == cores
+        assert Arbiter(workers=cores).render_workers() == 1
+        assert Arbiter(workers=cores * 2).render_workers() == 1
+        
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        serve_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py')
+        process = subprocess.Popen([sys.executable, '-u', serve_py, '--workers', '2',
+                                    '--port', str(port)], cwd=tempfile.mkdtemp(),
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        
+        def get(path):
+            for _ in range(100):
+                try:
+                    with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}') as response:
+                        return response.status
+                except OSError:
+                    time.sleep(0.2)
+            raise AssertionError(f"No answer for {path}")
+        
+        assert all(get('/api/stats') == 200 for _ in range(10))
+        process.send_signal(signal.SIGHUP)
+        time.sleep(1)
+        assert get('/jobs') == 200
+        process.send_signal(signal.SIGTERM)
+        output = process.communicate(timeout=60)[0]
+        
+        assert process.returncode == 0, output
+        # Two workers at start and two more after the reload
+        assert output.count('ready') == 4, output
+        assert 'Server stopped' in output
+        print("✅ Pre-fork server test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Pre-fork server test failed: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        if process is not None and process.poll() is None:
+            process.kill()
+
 def main():
     """Run all tests"""
     print("🧪 Running Application Tests")
@@ -151,6 +919,57 @@ def main():
     if not test_database():
         all_passed = False
     
+    if not test_search_index():
+        all_passed = False
+    
+    if not test_aggregate_stats():
+        all_passed = False
+    
+    if not test_exporter():
+        all_passed = False
+    
+    if not test_retention():
+        all_passed = False
+    
+    if not test_writer():
+        all_passed = False
+    
+    if not test_change_feed():
+        all_passed = False
+    
+    if not test_product_details():
+        all_passed = False
+    
+    if not test_matching():
+        all_passed = False
+    
+    if not test_chart_aggregates():
+        all_passed = False
+    
+    if not test_chart_cache():
+        all_passed = False
+    
+    if not test_chart_endpoints():
+        all_passed = False
+    
+    if not test_render_pool():
+        all_passed = False
+    
+    if not test_price_rollups():
+        all_passed = False
+    
+    if not test_scrape_jobs():
+        all_passed = False
+    
+    if not test_json_api():
+        all_passed = False
+    
+    if not test_response_cache():
+        all_passed = False
+    
+    if not test_prefork_server():
+        all_passed = False
+    
     print("\n" + "=" * 50)
     if all_passed:
         print("🎉 All tests passed! The application should work correctly.")
@@ -1,57 +1,293 @@
 import os
-import pandas as pd
+import json
+import hashlib
+import threading
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
+from collections import OrderedDict
 import base64
 
-# Try to import visualization libraries
-try:
-    import matplotlib
-    matplotlib.use('Agg')  # Use non-interactive backend
-    import matplotlib.pyplot as plt
-    import seaborn as sns
-    import numpy as np
-    VISUALIZATION_AVAILABLE = True
-except ImportError as e:
-    print(f"⚠️  Visualization libraries not available: {e}")
+# matplotlib and seaborn take about a second to import, so they are only
+# loaded by the first chart that is drawn (see _load_plotting)
+VISUALIZATION_AVAILABLE = all(
+    importlib.util.find_spec(name) is not None for name in ('matplotlib', 'seaborn')
+)
+if not VISUALIZATION_AVAILABLE:
+    print("⚠️  Visualization libraries not available")
     print("📊 Charts and graphs will be disabled, but the app will still work")
-    VISUALIZATION_AVAILABLE = False
-    # Create dummy objects to prevent errors
-    plt = None
-    sns = None
-    np = None
 
-class Visualizer:
-    def __init__(self):
-        self.visualization_available = VISUALIZATION_AVAILABLE
+plt = None
+sns = None
+_plotting_lock = threading.Lock()
+
+def _load_plotting():
+    """Import matplotlib/seaborn and set the chart style, once; return whether it worked"""
+    global plt, sns, VISUALIZATION_AVAILABLE
+    with _plotting_lock:
+        if plt is None and VISUALIZATION_AVAILABLE:
+            try:
+                import matplotlib
+                matplotlib.use('Agg')  # Use non-interactive backend
+                import matplotlib.pyplot as pyplot
+                import seaborn
+            except ImportError as e:
+                print(f"⚠️  Visualization libraries not available: {e}")
+                VISUALIZATION_AVAILABLE = False
+                return False
 
-        if self.visualization_available:
             # Set the style for all visualizations
-            sns.set_style("whitegrid")
-            plt.rcParams['figure.figsize'] = (10, 6)
-            plt.rcParams['font.size'] = 12
+            seaborn.set_style("whitegrid")
+            pyplot.rcParams['figure.figsize'] = (10, 6)
+            pyplot.rcParams['font.size'] = 12
+            plt, sns = pyplot, seaborn
+        return VISUALIZATION_AVAILABLE
+
+# Chart methods of Visualizer that can be rendered on their own
+CHART_TYPES = ('price_comparison', 'rating_comparison', 'price_distribution',
+               'price_vs_rating', 'price_trends')
+
+CHART_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'json': 'application/json',
+}
+
+# Most points sent to the browser for the price vs. rating scatter
+SCATTER_MAX_POINTS = 500
+
+class RenderCache:
+    """Bounded LRU of rendered charts, optionally backed by a directory on disk
+
+    Keys must change whenever the underlying data does, so entries never need
+    invalidating; stale ones simply fall out of the LRU. The disk tier keeps
+    renders across restarts and is pruned to max_disk_entries files.
+    """
+
+    def __init__(self, max_entries=32, cache_dir=None, max_disk_entries=256):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{key[0]}-{digest}.bin')
+
+    def get(self, key):
+        """Cached bytes for key, or None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if self.cache_dir:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    value = f.read()
+            except OSError:
+                return None
+            self._remember(key, value)
+            return value
+        return None
+
+    def put(self, key, value):
+        """Store bytes for key"""
+        self._remember(key, value)
+        if self.cache_dir:
+            path = self._path(key)
+            # Write then rename, so readers never see a partial file
+            with open(path + '.tmp', 'wb') as f:
+                f.write(value)
+            os.replace(path + '.tmp', path)
+            self._prune_disk()
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _prune_disk(self):
+        files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                 if name.endswith('.bin')]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=lambda path: os.path.getmtime(path))
+        for path in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        """Drop every cached render"""
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.bin'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+# pyplot keeps global state, so in-process renders must not overlap
+_RENDER_LOCK = threading.Lock()
+
+# Visualizer of a render worker process, created once by _init_render_worker
+_worker_visualizer = None
+
+def _init_render_worker():
+    """Import matplotlib/seaborn and set up the style before the first job arrives"""
+    global _worker_visualizer
+    _load_plotting()
+    _worker_visualizer = Visualizer(cache_size=0)
+
+def _render_in_worker(chart_type, df, fmt):
+    return getattr(_worker_visualizer, chart_type)(df, fmt=fmt)
+
+class RenderPool:
+    """Render charts in worker processes, each with its own pyplot state
+
+    Charts requested at the same time render in parallel instead of queueing
+    behind one pyplot lock. Workers start on first use with matplotlib and
+    seaborn already imported; they are spawned fresh rather than forked from
+    the threaded server. A render that times out or hits a crashed
+    worker raises, and the caller falls back to rendering in-process.
+    """
+
+    def __init__(self, workers=None, timeout=30):
+        self.workers = workers or min(len(CHART_TYPES), os.cpu_count() or 1)
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned, not forked: forking a threaded web worker can copy
+                # locks held by other threads into the child
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_render_worker,
+                    mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def render(self, chart_type, df, fmt='png'):
+        """Image bytes of one chart, rendered by a worker process"""
+        executor = self._get_executor()
+        try:
+            return executor.submit(_render_in_worker, chart_type, df, fmt).result(self.timeout)
+        except BrokenProcessPool:
+            # Start a fresh pool for the next render
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+class Visualizer:
+    def __init__(self, cache_size=32, cache_dir=None, render_pool=None):
+        self.visualization_available = VISUALIZATION_AVAILABLE
+        self.cache = RenderCache(cache_size, cache_dir)
+        self.render_pool = render_pool
 
         # Create directory for saving visualizations
         os.makedirs('static/images', exist_ok=True)
     
+    def _fig_to_bytes(self, fig, fmt='png'):
+        """Render a matplotlib figure to PNG or SVG bytes"""
+        buf = BytesIO()
+        fig.savefig(buf, format=fmt, bbox_inches='tight')
+        plt.close(fig)
+        return buf.getvalue()
+
     def _fig_to_base64(self, fig):
         """Convert matplotlib figure to base64 string for embedding in HTML"""
-        if not self.visualization_available:
+        if not _load_plotting():
             return None
 
-        buf = BytesIO()
-        fig.savefig(buf, format='png', bbox_inches='tight')
-        buf.seek(0)
-        img_str = base64.b64encode(buf.read()).decode('utf-8')
-        plt.close(fig)
-        return img_str
+        return base64.b64encode(self._fig_to_bytes(fig)).decode('utf-8')
+
+    def _finish(self, fig, fmt):
+        """Base64 PNG by default (for inline HTML), raw bytes when fmt is given"""
+        if fmt is None:
+            return self._fig_to_base64(fig)
+        return self._fig_to_bytes(fig, fmt)
+
+    def cached_chart(self, chart_type, load_data, category=None, fingerprint=None, fmt='png'):
+        """Render chart_type as PNG, SVG or JSON bytes, reusing the last render for the same data
+
+        chart_type is one of CHART_TYPES. load_data is only called on a cache
+        miss and returns the DataFrame (or summary dict, see
+        price_rating_summary()) to plot; empty data means no chart (None). fingerprint identifies the data (see Database.data_fingerprint);
+        without one nothing is cached.
+        """
+        if chart_type not in CHART_TYPES or fmt not in CHART_FORMATS:
+            raise ValueError(f"Unknown chart: {chart_type}.{fmt}")
+        # JSON series (see series()) are plotted by the browser and need no matplotlib
+        if fmt != 'json' and not self.visualization_available:
+            return None
+
+        key = (chart_type, category or '', fingerprint, fmt)
+        if fingerprint is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached or None
+
+        df = load_data()
+        image = b''
+        if not self._is_empty(df):
+            if fmt == 'json':
+                image = json.dumps(self.series(chart_type, df)).encode('utf-8')
+            else:
+                image = self._render(chart_type, df, fmt)
+
+        # Empty renders are cached too, so missing data costs nothing either
+        if fingerprint is not None:
+            self.cache.put(key, image)
+        return image or None
+
+    @staticmethod
+    def _is_empty(data):
+        if data is None:
+            return True
+        if isinstance(data, dict):
+            return not data.get('count')
+        return data.empty
+
+    def _render(self, chart_type, df, fmt):
+        """Image bytes of one chart, from the render pool when there is one"""
+        if self.render_pool is not None:
+            try:
+                return self.render_pool.render(chart_type, df, fmt)
+            except (FutureTimeoutError, BrokenProcessPool) as e:
+                print(f"⚠️  Render pool failed for {chart_type} ({e!r}), rendering in-process")
+
+        with _RENDER_LOCK:
+            return getattr(self, chart_type)(df, fmt=fmt)
 
     def _create_fallback_message(self, chart_type):
         """Create a fallback message when visualization is not available"""
         return f"📊 {chart_type} chart not available - visualization libraries not installed"
     
-    def price_comparison(self, df, title="Price Comparison Across Websites"):
+    def price_comparison(self, df, title="Price Comparison Across Websites", fmt=None):
         """Create a price comparison visualization"""
-        if not self.visualization_available:
+        if not _load_plotting():
             return None
 
         fig, ax = plt.subplots()
@@ -77,11 +313,11 @@ class Visualizer:
             ax.text(i, v + 1, f"${v:.2f}", ha='center')
         
         plt.tight_layout()
-        return self._fig_to_base64(fig)
+        return self._finish(fig, fmt)
     
-    def rating_comparison(self, df, title="Rating Comparison Across Websites"):
+    def rating_comparison(self, df, title="Rating Comparison Across Websites", fmt=None):
         """Create a rating comparison visualization"""
-        if not self.visualization_available:
+        if not _load_plotting():
             return None
 
         fig, ax = plt.subplots()
@@ -104,59 +340,81 @@ class Visualizer:
             ax.text(i, v + 0.1, f"{v:.1f}", ha='center')
         
         plt.tight_layout()
-        return self._fig_to_base64(fig)
+        return self._finish(fig, fmt)
     
-    def price_distribution(self, products, title="Price Distribution"):
-        """Create a price distribution visualization"""
-        if not self.visualization_available:
-            return None
+    def price_distribution(self, products, title="Price Distribution", fmt=None):
+        """Create a price distribution visualization
 
-        # Convert to DataFrame if it's a list of dictionaries
-        if isinstance(products, list):
-            df = pd.DataFrame(products)
-        else:
-            df = products
+        products is either raw rows or the pre-binned output of
+        Database.price_histogram(), which keeps the cost independent of the
+        catalog size.
+        """
+        if not _load_plotting():
+            return None
 
-        # Filter out products with no price
-        df = df[df['price'].notna()]
+        histogram = self._histogram(products)
+        if histogram.empty:
+            return None
 
         fig, ax = plt.subplots()
         
-        # Create a histogram with KDE
-        sns.histplot(df['price'], kde=True, ax=ax, bins=20, color='skyblue')
+        ax.bar(histogram['bin_start'], histogram['count'],
+               width=histogram['bin_end'] - histogram['bin_start'],
+               align='edge', color='skyblue', edgecolor='white')
         
         ax.set_title(title)
         ax.set_xlabel('Price ($)')
         ax.set_ylabel('Number of Products')
         
         # Add vertical line for mean price
-        mean_price = df['price'].mean()
+        mean_price = histogram['price_sum'].sum() / histogram['count'].sum()
         ax.axvline(mean_price, color='red', linestyle='--', linewidth=1)
         ax.text(mean_price + 1, ax.get_ylim()[1] * 0.9, f'Mean: ${mean_price:.2f}', color='red')
         
         plt.tight_layout()
-        return self._fig_to_base64(fig)
+        return self._finish(fig, fmt)
     
-    def price_vs_rating(self, products, title="Price vs. Rating"):
-        """Create a scatter plot of price vs. rating"""
-        if not self.visualization_available:
-            return None
+    def price_vs_rating(self, products, title="Price vs. Rating", fmt=None):
+        """Create a scatter plot of price vs. rating
 
-        # Convert to DataFrame if it's a list of dictionaries
-        if isinstance(products, list):
-            df = pd.DataFrame(products)
-        else:
-            df = products
+        products is either raw rows or the summary dict of
+        Database.price_rating_summary(): a density grid, per-rating quantiles,
+        a regression fitted in SQL and a fixed-size sample of points.
+        """
+        if not _load_plotting():
+            return None
 
-        # Filter out products with no price or rating
-        df = df[(df['price'].notna()) & (df['rating'].notna())]
+        summary = self._rating_summary(products)
+        if not summary['count']:
+            return None
 
         fig, ax = plt.subplots()
+
+        density = summary['density']
+        if not density.empty:
+            step = summary.get('rating_step', 0.5)
+            shade = (density['count'] / density['count'].max()).astype(float).values
+            ax.bar(density['rating'], density['bin_end'] - density['bin_start'],
+                   bottom=density['bin_start'], width=step, color=plt.cm.Blues(shade),
+                   alpha=0.6, linewidth=0)
+
+        sample = summary['sample']
+        ax.scatter(sample['rating'], sample['price'], s=10, alpha=0.5)
+
+        quantiles = summary['quantiles']
+        if not quantiles.empty:
+            ax.fill_between(quantiles['rating'], quantiles['p25'], quantiles['p75'],
+                            color='orange', alpha=0.2, label='Middle 50%')
+            ax.plot(quantiles['rating'], quantiles['median'], color='orange', marker='o',
+                    label='Median')
+
+        fit = summary['fit']
+        if fit:
+            ax.plot([0, 5], [fit['intercept'], fit['intercept'] + 5 * fit['slope']],
+                    color='red', label='Trend')
+        ax.legend(loc='upper left')
         
-        # Create a scatter plot with regression line
-        sns.regplot(x='rating', y='price', data=df, ax=ax, scatter_kws={'alpha':0.5}, line_kws={'color':'red'})
-        
-        ax.set_title(title)
+        ax.set_title(f"{title} ({summary['count']} products)")
         ax.set_xlabel('Rating')
         ax.set_ylabel('Price ($)')
         
@@ -164,25 +422,22 @@ class Visualizer:
         ax.set_xlim(0, 5)
         
         plt.tight_layout()
-        return self._fig_to_base64(fig)
+        return self._finish(fig, fmt)
     
-    def price_trends(self, products, title="Price Trends Over Time"):
+    def price_trends(self, products, title="Price Trends Over Time", fmt=None):
         """Create a visualization of price trends over time"""
-        if not self.visualization_available:
+        if not _load_plotting():
             return None
 
+        import pandas as pd
+
         # Convert to DataFrame if it's a list of dictionaries
         if isinstance(products, list):
             df = pd.DataFrame(products)
         else:
             df = products
 
-        # Convert timestamp to datetime and filter out products with no price
-        df = df[df['price'].notna()].copy()
-        df['date'] = pd.to_datetime(df['timestamp'], unit='s')
-
-        # Group by date and calculate average price
-        daily_avg = df.groupby(df['date'].dt.date)['price'].mean().reset_index()
+        daily_avg = self._daily_average(df)
 
         fig, ax = plt.subplots()
         
@@ -190,11 +445,136 @@ class Visualizer:
         sns.lineplot(x='date', y='price', data=daily_avg, ax=ax, marker='o')
         
         ax.set_title(title)
-        ax.set_xlabel('Date')
+        ax.set_xlabel('Time' if df.attrs.get('resolution') == 'hour' else 'Date')
         ax.set_ylabel('Average Price ($)')
         
         # Rotate x-axis labels for better readability
         plt.xticks(rotation=45, ha='right')
         
         plt.tight_layout()
-        return self._fig_to_base64(fig)
\ No newline at end of file
+        return self._finish(fig, fmt)
+
+    @staticmethod
+    def _daily_average(df):
+        """One 'date'/'price' row per day from raw observations or pre-aggregated rows"""
+        import pandas as pd
+
+        if 'timestamp' not in df.columns:
+            # Already aggregated into one 'date'/'price' row per day
+            return df
+
+        # Convert timestamp to datetime and filter out products with no price
+        df = df[df['price'].notna()].copy()
+        df['date'] = pd.to_datetime(df['timestamp'], unit='s')
+
+        # Group by date and calculate average price
+        return df.groupby(df['date'].dt.date)['price'].mean().reset_index()
+
+    @staticmethod
+    def _histogram(products, bins=20):
+        """Rows of bin_start/bin_end/count/price_sum, binning raw rows if needed"""
+        import pandas as pd
+
+        df = pd.DataFrame(products) if isinstance(products, list) else products
+        if 'bin_start' in df.columns:
+            return df
+
+        prices = df['price'].dropna() if 'price' in df.columns else pd.Series(dtype=float)
+        if prices.empty:
+            return pd.DataFrame(columns=['bin_start', 'bin_end', 'count', 'price_sum'])
+        binned, edges = pd.cut(prices, bins=bins, retbins=True)
+        grouped = prices.groupby(binned, observed=False)
+        return pd.DataFrame({
+            'bin_start': edges[:-1],
+            'bin_end': edges[1:],
+            'count': grouped.count().values,
+            'price_sum': grouped.sum().values,
+        })
+
+    @staticmethod
+    def _rating_summary(products, max_points=SCATTER_MAX_POINTS):
+        """Summary dict as from Database.price_rating_summary(), built from raw rows if needed"""
+        import pandas as pd
+
+        if isinstance(products, dict):
+            return products
+
+        df = pd.DataFrame(products) if isinstance(products, list) else products
+        df = df[(df['price'].notna()) & (df['rating'].notna())]
+        fit = None
+        if len(df) > 1 and df['rating'].var() > 0:
+            slope = df['rating'].cov(df['price']) / df['rating'].var()
+            fit = {'slope': float(slope),
+                   'intercept': float(df['price'].mean() - slope * df['rating'].mean())}
+        return {
+            'count': len(df),
+            'fit': fit,
+            'quantiles': pd.DataFrame(columns=['rating', 'count', 'p25', 'median', 'p75']),
+            'density': pd.DataFrame(columns=['rating', 'bin_start', 'bin_end', 'count']),
+            'sample': df.sample(n=max_points, random_state=0) if len(df) > max_points else df,
+        }
+
+    @staticmethod
+    def _values(column):
+        """Plain floats for JSON, with NaN as None"""
+        import pandas as pd
+
+        return [None if pd.isna(v) else float(v) for v in column]
+
+    def series(self, chart_type, df, bins=20, max_points=SCATTER_MAX_POINTS):
+        """Pre-aggregated data behind chart_type, for plotting in the browser"""
+        import pandas as pd
+
+        if chart_type == 'price_comparison':
+            return {
+                'sites': df['source_site'].tolist(),
+                'count': [int(v) for v in df['count']],
+                'avg_price': self._values(df['avg_price']),
+                'min_price': self._values(df['min_price']),
+                'max_price': self._values(df['max_price']),
+            }
+
+        if chart_type == 'rating_comparison':
+            return {
+                'sites': df['source_site'].tolist(),
+                'count': [int(v) for v in df['count']],
+                'avg_rating': self._values(df['avg_rating']),
+            }
+
+        if chart_type == 'price_distribution':
+            histogram = self._histogram(df, bins)
+            if histogram.empty:
+                return {'edges': [], 'counts': [], 'mean': None}
+            return {
+                'edges': self._values(list(histogram['bin_start']) + [histogram['bin_end'].iloc[-1]]),
+                'counts': [int(v) for v in histogram['count']],
+                'mean': float(histogram['price_sum'].sum() / histogram['count'].sum()),
+            }
+
+        if chart_type == 'price_vs_rating':
+            # The regression uses every point; only the drawn points are sampled
+            summary = self._rating_summary(df, max_points)
+            sample = summary['sample'].head(max_points)
+            quantiles = summary['quantiles']
+            return {
+                'points': [[float(r), float(p)] for r, p in zip(sample['rating'], sample['price'])],
+                'total': int(summary['count']),
+                'fit': summary['fit'],
+                'quantiles': {
+                    'rating': self._values(quantiles['rating']),
+                    'p25': self._values(quantiles['p25']),
+                    'median': self._values(quantiles['median']),
+                    'p75': self._values(quantiles['p75']),
+                },
+            }
+
+        if chart_type == 'price_trends':
+            daily_avg = self._daily_average(df)
+            # Hourly series from Database.price_series need the time of day too
+            label = '%Y-%m-%d %H:%M' if df.attrs.get('resolution') == 'hour' else '%Y-%m-%d'
+            return {
+                'dates': [pd.Timestamp(d).strftime(label) for d in daily_avg['date']],
+                'price': self._values(daily_avg['price']),
+            }
+
+        raise ValueError(f"Unknown chart: {chart_type}")
@@ -0,0 +1,114 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+# Queue markers used alongside (products, source_site, category, future) items
+_FLUSH = object()
+_STOP = object()
+
+class DatabaseWriter:
+    """Single writer thread that serialises all product inserts
+
+    Scrapers call submit() from any thread. Batches wait on a bounded queue
+    and the writer thread coalesces them into one transaction, committing once
+    max_batch_rows have been collected or max_delay seconds have passed since
+    the first waiting batch, whichever comes first. SQLite only ever sees one
+    writer, so concurrent scrapes no longer compete for the write lock.
+
+    The Database stays shared with request threads: its connection is
+    per-thread, so the writer's open transaction never mixes with reads.
+    """
+
+    def __init__(self, database, max_queue=100, max_batch_rows=2000, max_delay=0.5):
+        self.database = database
+        self.max_batch_rows = max_batch_rows
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the writer thread if it is not already running"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, products, source_site, category='', timeout=None):
+        """Queue products for saving
+
+        Blocks while the queue is full. Returns a Future that resolves to the
+        number of rows written once the transaction containing them commits.
+        """
+        self.start()
+        future = Future()
+        self._queue.put((list(products), source_site, category, future), timeout=timeout)
+        return future
+
+    def flush(self, timeout=None):
+        """Return a Future that resolves once everything queued so far is committed"""
+        self.start()
+        future = Future()
+        self._queue.put((_FLUSH, None, None, future), timeout=timeout)
+        return future
+
+    def close(self, timeout=None):
+        """Write out pending batches and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put((_STOP, None, None, None), timeout=timeout)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            deadline = time.monotonic() + self.max_delay
+            pending = []
+            pending_rows = 0
+            markers = []
+            stop = False
+
+            # Keep collecting until the batch is big enough or the deadline passes
+            while True:
+                products = item[0]
+                if products is _STOP:
+                    stop = True
+                    break
+                if products is _FLUSH:
+                    markers.append(item[3])
+                    break
+                pending.append(item)
+                pending_rows += len(products)
+                if pending_rows >= self.max_batch_rows:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            self._write(pending)
+            for marker in markers:
+                marker.set_result(True)
+            if stop:
+                return
+
+    def _write(self, pending):
+        """Commit the collected batches in one transaction and resolve their futures"""
+        if not pending:
+            return
+        try:
+            self.database.save_batches([(p, site, category) for p, site, category, _ in pending])
+        except Exception as e:
+            if len(pending) == 1:
+                pending[0][3].set_exception(e)
+                return
+            # Retry one batch per transaction so a single bad batch only fails its own caller
+            for item in pending:
+                self._write([item])
+            return
+        for products, _, _, future in pending:
+            future.set_result(len(products))